@@ -1,6 +1,52 @@
+"""
+This file joins the transcripts to the creator and sponsor videos and saves the result.
+
+The transcripts are attached with one vectorized map of video_id -> transcript (transcripts2
+overrides transcripts for the same id), and the result is saved as Parquet by default: typed
+columns, no CSV quoting of the text, and readers can load only the columns they need, e.g.
+    load_transcripts("videos_transcripts.parquet", columns=['video_id', 'type', 'length'])
+without reading the transcripts (Parquet needs pyarrow; --format csv writes the old CSV).
+With --store the transcripts are read from the transcript store (one sequential scan) instead
+of the transcript folders.
+
+With --incremental only the new and changed transcript files are read: the state file keeps
+(video_id, path, size, mtime, hash, transcript) of the previous run, a file whose path, size and
+mtime did not change is taken from it, and the others are read (in parallel) and merged in. A
+transcripts2 file that appears for an id overrides its transcripts file (the path changes), and
+an id whose files are gone is dropped.
+
+Usage: python aggregate_transcripts.py -o videos_transcripts.parquet
+       python aggregate_transcripts.py -o videos_transcripts.parquet --incremental
+"""
+
 import os
+import hashlib
+import logging
+import argparse
 import pandas as pd
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
+import transcript_store
+
+# later folders override earlier ones for the same video_id
+TRANSCRIPT_DIRS = ["transcripts", "transcripts2"]
+TRANSCRIPT_EXT = '.txt'
+STATE_COLUMNS = ['video_id', 'path', 'size', 'mtime', 'hash', 'transcript']
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Join the transcripts to the creator and sponsor videos')
+    parser.add_argument('--creators', help='The CSV file of the creator videos', default="videos_creators.csv")
+    parser.add_argument('--sponsors', help='The CSV file of the sponsor videos', default="videos_sponsors.csv")
+    parser.add_argument('-t', '--transcripts', help='The transcript folders (later ones override earlier ones)', nargs='+', default=TRANSCRIPT_DIRS)
+    parser.add_argument('--store', help='Read the transcripts from the transcript store (SQLite file) instead of the folders', default=None)
+    parser.add_argument('-o', '--output', help='The output file', default="videos_transcripts.parquet")
+    parser.add_argument('--format', help='The output format (default: from the extension of the output)', choices=['parquet', 'csv'], default=None)
+    parser.add_argument('--incremental', help='Only read the new and changed transcript files (see --state)', action='store_true')
+    parser.add_argument('--state', help='The state of the incremental mode (Parquet); defaults to <output>.state.parquet', default=None)
+    return parser.parse_args()
 
 
 # load the transcripts
@@ -8,80 +54,184 @@ def read_transcript(file):
     with open(file, 'r') as f:
         transcript = f.read()
         return transcript
-     
-# Set the path to the directory containing the data
-creators = pd.read_csv("videos_creators.csv")
-sponsors = pd.read_csv("videos_sponsors.csv")
-
-# print the shape of the data
-print(f"Creators: {creators.shape}")
-print(f"Sponsors: {sponsors.shape}")
-
-# print the columns
-print("Columns")
-print(creators.columns)
-print(sponsors.columns)
-
-# modifying the columns
-ccols = ['video_id', 'creator_id', 'creator_name', 'video_title',
-       'video_description', 'video_url', 'video_topics']
-scols = ['video_id', 'creator_id', 'creator_name', 'title',
-       'description', 'video_url', 'topics']
-creators = creators[ccols].copy()
-sponsors = sponsors[scols].copy()
-creators.columns = scols
-creators['type'] = "creator"
-sponsors['type'] = "sponsor"
-
-# print the columns
-print("Updated Columns")
-print(creators.columns)
-print(sponsors.columns)
-
-# stack the data vertically
-combined = pd.concat([creators, sponsors], axis=0, ignore_index=True)
-
-print(combined.head())
-print(combined.shape)
-
-# create a dictionary of video_id and transcript file
-transcript_dict = {}
-print("Creating transcript dictionary")
-for root, dirs, files in os.walk("transcripts"):
-    for file in files:
-        video_id = file.split(".")[0]
-        transcript_dict[video_id] = os.path.join(root, file)
-for root, dirs, files in os.walk("transcripts2"):
-    for file in files:
-        video_id = file.split(".")[0]
-        transcript_dict[video_id] = os.path.join(root, file)
-
-# transcript dictionary
-transcript_text_dict = {}
-for video_id, video_file in transcript_dict.items():
-    #print(video_id, video_file)
-    if os.path.exists(video_file):
-        #print(f"Transcript file found for video {video_id}")
-        transcript_text = read_transcript(video_file)
-        transcript_text_dict[video_id] = transcript_text
+
+
+def load_videos(creators_file, sponsors_file):
+    """
+    Stack the creator and sponsor videos with the same columns and a type column.
+    """
+    # Set the path to the directory containing the data
+    creators = pd.read_csv(creators_file)
+    sponsors = pd.read_csv(sponsors_file)
+
+    # print the shape of the data
+    print(f"Creators: {creators.shape}")
+    print(f"Sponsors: {sponsors.shape}")
+
+    # modifying the columns
+    ccols = ['video_id', 'creator_id', 'creator_name', 'video_title',
+           'video_description', 'video_url', 'video_topics']
+    scols = ['video_id', 'creator_id', 'creator_name', 'title',
+           'description', 'video_url', 'topics']
+    creators = creators[ccols].copy()
+    sponsors = sponsors[scols].copy()
+    creators.columns = scols
+    creators['type'] = "creator"
+    sponsors['type'] = "sponsor"
+
+    # stack the data vertically
+    return pd.concat([creators, sponsors], axis=0, ignore_index=True)
+
+
+def transcript_files(directories, suffix=TRANSCRIPT_EXT):
+    """
+    Map video_id -> transcript file (<video_id>.txt); a later directory overrides an earlier one for the same id.
+    """
+    transcript_dict = {}
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            for file in files:
+                # the journals (.txt.journal, .txt.tmp) and the subtitles (.vtt, .srt) are not transcripts
+                if file.endswith(suffix):
+                    transcript_dict[file[:-len(suffix)]] = os.path.join(root, file)
+    return transcript_dict
+
+
+def scan_transcripts(directories, suffix=TRANSCRIPT_EXT):
+    """
+    Get the (video_id, path, size, mtime) of the transcript files (stat only); a later directory overrides an earlier one.
+    """
+    files = {}
+    for directory in directories:
+        for root, dirs, names in os.walk(directory):
+            for name in names:
+                if not name.endswith(suffix):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files[name[:-len(suffix)]] = (path, stat.st_size, stat.st_mtime)
+    return pd.DataFrame([(video_id,) + values for video_id, values in files.items()],
+                        columns=['video_id', 'path', 'size', 'mtime'])
+
+
+def incremental_transcripts(directories, state_file, workers=16):
+    """
+    Read only the transcript files that are new or changed since the previous run and merge them into its state.
+
+    Parameters
+    ----------
+    directories : list
+        The transcript folders (later ones override earlier ones).
+    state_file : str
+        The state of the previous run (Parquet); it is updated.
+    workers : int, optional
+        The number of parallel readers.
+
+    Returns
+    -------
+    pandas.Series
+        video_id -> transcript.
+    """
+    current = scan_transcripts(directories)
+    if os.path.isfile(state_file):
+        previous = pd.read_parquet(state_file)
     else:
-        #print(f"Transcript file not found for video {video_id}")
-        pass
-
-# Aggregate the transcripts
-print('Aggregating transcripts')
-transcripts = []
-for i, row in tqdm(combined.iterrows(), desc='Creators and Sponsors'):
-    video_id = str(row["video_id"])
-    transcript = transcript_text_dict.get(video_id,None)    
-    transcripts.append(transcript)
-
-combined["transcript"] = transcripts
-
-# print the missing transcripts
-print("Missing Transcripts")
-print(combined[(combined["transcript"].isnull()) | (combined["transcript"] == "")].shape)
-
-# Save the data
-print("Saving the data")
-combined.to_csv("videos_transcripts.csv", index=False)
\ No newline at end of file
+        previous = pd.DataFrame(columns=STATE_COLUMNS)
+    merged = current.merge(previous, on='video_id', how='left', suffixes=('', '_prev'))
+    unchanged = ((merged['path'] == merged['path_prev']) & (merged['size'] == merged['size_prev'])
+                 & (merged['mtime'] == merged['mtime_prev']))
+    # hash and transcript are the columns of the previous run
+    kept = merged.loc[unchanged, STATE_COLUMNS]
+
+    # read the new and changed files, many at once (the reads wait on the disk)
+    read = merged[~unchanged]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        texts = list(executor.map(read_transcript, read['path']))
+    hashes = [hashlib.md5(text.encode()).hexdigest() for text in texts]
+    # touched files with the same content are read but do not count as changed
+    changed = int((read['hash'] != pd.Series(hashes, index=read.index)).sum())
+    read = read.assign(transcript=texts, hash=hashes)
+    removed = len(set(previous['video_id']) - set(current['video_id']))
+
+    state = pd.concat([kept, read[STATE_COLUMNS]], ignore_index=True)
+    state.to_parquet(state_file, index=False, compression='zstd')
+    logging.info(f"Incremental transcripts: {len(kept)} unchanged, {len(read)} read ({changed} changed), {removed} removed")
+    print(f"Transcripts: {len(kept)} unchanged, {len(read)} read ({changed} changed), {removed} removed")
+    return state.set_index('video_id')['transcript']
+
+
+def attach_transcripts(combined, transcripts):
+    """
+    Add the transcript and length (words) columns with one vectorized lookup per column.
+
+    Parameters
+    ----------
+    combined : pandas.DataFrame
+        The videos (video_id column).
+    transcripts : dict or pandas.Series
+        video_id (str) -> transcript text.
+    """
+    combined = combined.copy()
+    # object dtype: the .str accessor also works when no video has a transcript (all missing)
+    combined["transcript"] = combined["video_id"].astype(str).map(transcripts).astype(object)
+    combined["length"] = combined["transcript"].str.split().str.len().fillna(0).astype('int64')
+    combined["type"] = combined["type"].astype('category')
+    return combined
+
+
+def save_transcripts(combined, output, format=None):
+    """
+    Save the aggregated data as Parquet (typed, compressed, column projection) or CSV.
+    """
+    format = format or ('csv' if output.endswith('.csv') else 'parquet')
+    if format == 'csv':
+        combined.to_csv(output, index=False)
+    else:
+        # zstd compresses the text well and decompresses fast
+        combined.to_parquet(output, index=False, compression='zstd')
+
+
+def load_transcripts(path, columns=None):
+    """
+    Load the aggregated data; with Parquet only the given columns are read (e.g. without the transcripts).
+    """
+    if path.endswith('.csv'):
+        return pd.read_csv(path, usecols=columns)
+    return pd.read_parquet(path, columns=columns)
+
+
+def main():
+    args = get_args()
+    combined = load_videos(args.creators, args.sponsors)
+    print(combined.shape)
+
+    if args.store:
+        print("Loading the transcript store")
+        transcript_text_dict = transcript_store.TranscriptStore(args.store).to_series()
+    elif args.incremental:
+        print("Reading the new and changed transcripts")
+        transcript_text_dict = incremental_transcripts(args.transcripts, args.state or args.output + '.state.parquet')
+    else:
+        # create a dictionary of video_id and transcript file
+        print("Creating transcript dictionary")
+        transcript_dict = transcript_files(args.transcripts)
+
+        # transcript dictionary
+        transcript_text_dict = {video_id: read_transcript(video_file) for video_id, video_file in transcript_dict.items()
+                                if os.path.exists(video_file)}
+
+    # Aggregate the transcripts
+    print('Aggregating transcripts')
+    combined = attach_transcripts(combined, transcript_text_dict)
+
+    # print the missing transcripts
+    print("Missing Transcripts")
+    print(combined[(combined["transcript"].isnull()) | (combined["transcript"] == "")].shape)
+
+    # Save the data
+    print("Saving the data")
+    save_transcripts(combined, args.output, args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,13 @@
-import os
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
+from aggregate_transcripts import incremental_transcripts
+from sponsor_matcher import SponsorMatcher
+from transcript_index import TranscriptIndex
 
 PATH = "E:/Facebook/transcripts/sponsored/"
+STATE = "E:/Facebook/transcripts/sponsored_transcripts.state.parquet"
+INDEX = "E:/Facebook/transcripts/sponsored_index"
 
 # load the transcripts
 def read_transcript(file):
@@ -12,15 +16,12 @@ def read_transcript(file):
         return transcript
      
 # create a dictionary of video_id and transcript
-transcript_dict = {}
+# only the new and changed files are read; the others come from the state of the previous run
 print("Creating transcript dictionary")
-for root, dirs, files in os.walk(PATH):
-    for file in files:
-        video_id = file.split(".")[0]
-        transcript_dict[video_id] = read_transcript(os.path.join(root, file))
+transcript_dict = incremental_transcripts([PATH], STATE)
 
 # data frame
-df = pd.DataFrame(transcript_dict.items(), columns=["video_id", "transcript"])
+df = pd.DataFrame({"video_id": transcript_dict.index, "transcript": transcript_dict.values})
 df['video_id'] = df['video_id'].astype(np.int64)
 
 # transcript length
@@ -58,44 +59,31 @@ print("Number of matching video_id: ", data.merge(vca, on='video_id', how='inner
 
 data['transcript'] = data.merge(df, left_on='new_id', right_on='video_id', how='left').transcript
 
-sponsored = data[(data.sponsor_name.notnull()) & (data.transcript.notnull())][['sponsor_name','transcript']]
+sponsored = data[(data.sponsor_name.notnull()) & (data.transcript.notnull())][['sponsor_name','transcript','new_id']]
 sponsored['terms'] = sponsored.sponsor_name.apply(lambda x: x.split())
 
-def is_in_text(terms, text):
-    if ' '.join(terms).lower() in text.lower():
-        return True
-    for term in terms:
-        if term.lower() in ['the','a','an','of','and','or','in','on','at','to','for','with','by','from','as','is']:
-            continue
-        if term.lower() in text.lower().split():
-            return True
-    return False
-
-def term_in_text(terms, text):
-    found = []
-    if ' '.join(terms).lower() in text.lower():
-        return terms
-    for term in terms:
-        if term.lower() in ['the','a','an','of','and','or','in','on','at','to','for','with','by','from','as','is']:
-            continue
-        if term.lower() in text.lower().split():
-            found.append(term)
-    return found
-
-def sponsored_by(text):
-    if 'sponsored' in text.lower().split():
-        return True
-    elif 'brought to you by' in text.lower():
-        return True
-    return False
-
-sponsored['is_in_text'] = sponsored.apply(lambda x: is_in_text(x.terms, x.transcript), axis=1)
+# all sponsor names, their terms and the disclosures ("sponsored", "brought to you by") in one automaton:
+# each transcript is scanned once (see sponsor_matcher.py)
+matcher = SponsorMatcher(sponsored.sponsor_name.unique())
+matches = matcher.match_frame(sponsored)
+sponsored['is_in_text'] = matches.is_in_text
 print(sponsored['is_in_text'].sum())
-sponsored['found_terms'] = sponsored.apply(lambda x: term_in_text(x.terms, x.transcript), axis=1)
-sponsored['sponsored_by'] = sponsored.transcript.apply(sponsored_by)
+sponsored['found_terms'] = matches.found_terms
+sponsored['sponsored_by'] = matches.sponsored_by
 print(sponsored['sponsored_by'].sum())
 
-temp = sponsored[sponsored.is_in_text==True][['sponsor_name','found_terms','transcript']]
+temp = sponsored[sponsored.is_in_text==True][['sponsor_name','found_terms','transcript','new_id']]
+
+# positional index of the transcripts (kept on disk; only the new and changed transcripts are added)
+index = TranscriptIndex(INDEX)
+hashes = pd.read_parquet(STATE, columns=['video_id', 'hash']).set_index('video_id')['hash']
+index.add((video_id, transcript, hashes[video_id]) for video_id, transcript in zip(df.video_id.astype(str), df.transcript)
+          if index.outdated(video_id, hashes[video_id]))
+
+def show_context(ind, word, window=5):
+    # the words around each occurrence of word in the transcript of row ind (from the index, no re-splitting)
+    for hit in index.kwic(word, window, video_ids=[int(temp.loc[ind,'new_id'])]):
+        print(hit.left + hit.match + hit.right)
 
 # function to show 20 rows of a data frame at a time every time by pressing enter
 def display(df):
@@ -111,23 +99,17 @@ temp2 = temp[temp.found=="Live"].copy()
 
 for ind in temp2.index:
     print(temp2.loc[ind,'sponsor_name'])
-    for i,term in enumerate(temp2.loc[ind,'transcript'].split()):
-        if term.lower() == 'live':
-            print(temp2.loc[ind,'transcript'].split()[i-5:i+5])
+    show_context(ind, 'live')
     print("\n\n")
 
 for ind in temp[temp.found=="Real"].index:
     print(temp.loc[ind,'sponsor_name'])
-    for i,term in enumerate(temp.loc[ind,'transcript'].split()):
-        if term.lower() == 'real':
-            print(temp.loc[ind,'transcript'].split()[i-5:i+5])
+    show_context(ind, 'real')
     print("\n\n")
 
 for ind in [200576, 200717, 204485, 207797]:
     print(temp.loc[ind,'sponsor_name'])
-    for i, term in enumerate(temp.loc[ind,'transcript'].split()):
-        if term.lower() == temp.loc[ind,'found'].lower():
-            print(temp.loc[ind,'transcript'].split()[i-5:i+5])
+    show_context(ind, temp.loc[ind,'found'])
     print("\n\n")
 
 # finding:
@@ -0,0 +1,110 @@
+"""
+This file converts PCM audio to a target format (mono, sample rate, sample width) with NumPy.
+
+All channels are downmixed, resampled and requantized in one vectorized pass per chunk:
+* downmix: mean over the interleaved channels
+* resample: band-limited FFT resampling (the spectrum is truncated or zero padded), so
+  downsampling does not alias
+* requantize: rounding and clipping to the target integer width
+When the sample rate does not change, the downmix and requantization stay in integers (sum of
+the channels in a wider integer, then a division and a shift), without the float conversion.
+
+It replaces the sample-by-sample audioop conversions (audioop is removed in Python 3.13).
+"""
+
+import numpy as np
+from collections import namedtuple
+from pydub import AudioSegment
+
+SAMPLE_TYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+# raw interleaved samples of one chunk; data can be any bytes-like object (bytes, memoryview)
+PCMChunk = namedtuple('PCMChunk', ['data', 'frame_rate', 'sample_width', 'channels'])
+
+
+def resample(samples, from_rate, to_rate):
+    """
+    Resample a mono float array from one sample rate to another (FFT method).
+    """
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    n_out = int(round(len(samples) * to_rate / from_rate))
+    spectrum = np.fft.rfft(samples)
+    n_bins = n_out // 2 + 1
+    if n_bins <= len(spectrum):
+        spectrum = spectrum[:n_bins]
+    else:
+        spectrum = np.concatenate((spectrum, np.zeros(n_bins - len(spectrum), dtype=spectrum.dtype)))
+    return np.fft.irfft(spectrum, n_out) * (n_out / len(samples))
+
+
+def _downmix_int(chunk, sample_width, block=1 << 16):
+    # integer downmix and requantization (same sample rate): floor of the channel mean, then a shift;
+    # blocks of frames are summed in a wider integer and written into the output (small temporaries)
+    frames = np.frombuffer(chunk.data, dtype=SAMPLE_TYPES[chunk.sample_width]).reshape(-1, chunk.channels)
+    out = np.empty(len(frames), dtype=SAMPLE_TYPES[sample_width])
+    wide = np.int64 if chunk.sample_width == 4 else np.int32
+    shift = 8 * (sample_width - chunk.sample_width)
+    for start in range(0, len(frames), block):
+        part = frames[start:start + block]
+        total = part[:, 0].astype(wide)
+        for channel in range(1, chunk.channels):
+            total += part[:, channel]
+        if chunk.channels == 2:
+            total >>= 1
+        elif chunk.channels > 2:
+            total //= chunk.channels
+        if shift > 0:
+            total <<= shift
+        elif shift < 0:
+            total >>= -shift
+        out[start:start + block] = total
+    return out
+
+
+def normalize_pcm(chunk, frame_rate=None, sample_width=2):
+    """
+    Convert a PCM chunk to mono at the given sample rate and width.
+
+    Parameters
+    ----------
+    chunk : PCMChunk
+        data (bytes-like), frame_rate, sample_width and channels of the input.
+    frame_rate : int, optional
+        The target sample rate. None keeps the rate of the chunk.
+    sample_width : int, optional
+        The target sample width in bytes (1, 2 or 4).
+
+    Returns
+    -------
+    PCMChunk
+        The converted chunk. A chunk already in the target format is returned as is (no copy);
+        the data of a chunk converted without resampling is a memoryview of its samples.
+    """
+    frame_rate = frame_rate or chunk.frame_rate
+    if chunk.channels == 1 and chunk.frame_rate == frame_rate and chunk.sample_width == sample_width:
+        return chunk
+    if chunk.frame_rate == frame_rate:
+        return PCMChunk(memoryview(_downmix_int(chunk, sample_width)).cast('B'), frame_rate, sample_width, 1)
+    samples = np.frombuffer(chunk.data, dtype=SAMPLE_TYPES[chunk.sample_width])
+    if chunk.channels > 1:
+        samples = samples.reshape(-1, chunk.channels).mean(axis=1)
+    else:
+        samples = samples.astype(np.float64)
+    samples = resample(samples, chunk.frame_rate, frame_rate)
+    if sample_width != chunk.sample_width:
+        samples = samples * 2.0 ** (8 * (sample_width - chunk.sample_width))
+    info = np.iinfo(SAMPLE_TYPES[sample_width])
+    samples = np.clip(np.rint(samples), info.min, info.max).astype(SAMPLE_TYPES[sample_width])
+    return PCMChunk(samples.tobytes(), frame_rate, sample_width, 1)
+
+
+def normalize_audio(segment, frame_rate=16000, sample_width=2):
+    """
+    Convert a pydub AudioSegment to mono at the given sample rate and width.
+    """
+    chunk = normalize_pcm(PCMChunk(segment.raw_data, segment.frame_rate, segment.sample_width, segment.channels),
+                          frame_rate, sample_width)
+    if chunk.data is segment.raw_data:
+        return segment
+    return AudioSegment(data=chunk.data, sample_width=sample_width, frame_rate=frame_rate, channels=1)
@@ -0,0 +1,174 @@
+"""
+This file streams the audio track of a video file through ffmpeg as raw PCM.
+
+Instead of decoding the whole track into memory (AudioSegment.from_file), ffmpeg writes
+signed little-endian PCM to a pipe and the audio is read back in fixed-size windows.
+Each window is handed to the caller as soon as it is decoded, so peak memory is bounded
+by the chunk size and not by the length of the video.
+
+extract_audio is the single extraction stage of the transcription scripts: one ffmpeg process
+demuxes, decodes, downmixes and resamples the audio to 16 kHz mono in one pass (no separate
+probe, no moviepy VideoFileClip).
+"""
+
+import subprocess
+import tempfile
+import logging
+from pydub import AudioSegment
+from pydub.utils import mediainfo_json
+from pydub.exceptions import CouldntDecodeError
+
+# raw PCM formats understood by ffmpeg, keyed by sample width in bytes
+PCM_FORMATS = {2: 's16le', 4: 's32le'}
+
+# the format handed to the recognizers by extract_audio
+TARGET_RATE = 16000
+TARGET_CHANNELS = 1
+
+
+def probe_audio(video_file):
+    """
+    Get the sample rate and channel count of the first audio stream of a file.
+
+    Parameters
+    ----------
+    video_file : str
+        The path to the video (or audio) file.
+
+    Returns
+    -------
+    tuple
+        (frame_rate, channels) of the audio stream.
+        Raises IndexError if the file has no audio stream (same as AudioSegment.from_file).
+    """
+    info = mediainfo_json(video_file)
+    audio_streams = [x for x in info['streams'] if x['codec_type'] == 'audio']
+    return int(audio_streams[0]['sample_rate']), int(audio_streams[0]['channels'])
+
+
+def stream_pcm(video_file, chunk_length_ms, frame_rate, channels, sample_width=2, start_ms=0):
+    """
+    Decode the audio of a file with ffmpeg and yield raw PCM windows of a fixed length.
+
+    Parameters
+    ----------
+    video_file : str
+        The path to the video (or audio) file.
+    chunk_length_ms : int
+        The length of each window in milliseconds (the last one may be shorter).
+    frame_rate : int
+        The sample rate ffmpeg should output.
+    channels : int
+        The number of channels ffmpeg should output.
+    sample_width : int, optional
+        The sample width in bytes (2 or 4).
+    start_ms : int, optional
+        Start decoding at this position (e.g. to resume after the chunks that are done).
+
+    Yields
+    ------
+    bytes
+        Interleaved PCM samples of one window.
+    """
+    if sample_width not in PCM_FORMATS:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    pcm_format = PCM_FORMATS[sample_width]
+    chunk_bytes = frame_rate * chunk_length_ms // 1000 * channels * sample_width
+
+    command = [AudioSegment.converter, '-nostdin', '-v', 'error']
+    if start_ms:
+        command += ['-ss', f'{start_ms / 1000:.3f}']   # input seeking: the skipped audio is not decoded
+    command += ['-i', video_file,
+               '-map', '0:a:0',                        # only the first audio stream (no video decoding)
+               '-f', pcm_format, '-acodec', f'pcm_{pcm_format}',
+               '-ac', str(channels), '-ar', str(frame_rate),
+               'pipe:1']
+    # stderr goes to a temporary file so a chatty ffmpeg can never block the pipe
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            while True:
+                data = process.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                yield data
+            process.wait()
+        finally:
+            # the consumer may stop early (e.g. on an error); do not leave ffmpeg running
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise CouldntDecodeError(
+                f"Decoding failed. ffmpeg returned error code: {process.returncode}\n\n"
+                f"Output from ffmpeg/avlib:\n\n{stderr.read().decode(errors='ignore')}")
+
+
+def stream_audio_chunks(video_file, chunk_length_ms, frame_rate=None, channels=None, sample_width=2, start_ms=0):
+    """
+    Stream the audio of a file as AudioSegment chunks of a fixed length.
+
+    The file is probed eagerly (so a missing audio stream raises IndexError here, like
+    AudioSegment.from_file), the decoding itself is lazy.
+
+    Parameters
+    ----------
+    video_file : str
+        The path to the video (or audio) file.
+    chunk_length_ms : int
+        The length of each chunk in milliseconds.
+    frame_rate : int, optional
+        The output sample rate. Defaults to the rate of the audio stream.
+    channels : int, optional
+        The output channel count. Defaults to the channel count of the audio stream.
+    sample_width : int, optional
+        The sample width in bytes (2 or 4).
+    start_ms : int, optional
+        The position of the first chunk in milliseconds.
+
+    Returns
+    -------
+    generator
+        AudioSegment chunks in order, decoded one at a time.
+    """
+    if frame_rate is None or channels is None:
+        probed_rate, probed_channels = probe_audio(video_file)
+        frame_rate = frame_rate or probed_rate
+        channels = channels or probed_channels
+    logging.debug(f"Streaming audio: {video_file} ({frame_rate} Hz, {channels} ch)")
+    return (AudioSegment(data=data, sample_width=sample_width, frame_rate=frame_rate, channels=channels)
+            for data in stream_pcm(video_file, chunk_length_ms, frame_rate, channels, sample_width, start_ms))
+
+
+def extract_audio(video_file, chunk_length_ms, frame_rate=TARGET_RATE, channels=TARGET_CHANNELS, sample_width=2,
+                  start_ms=0):
+    """
+    Extract the audio of a video file as AudioSegment chunks in a single ffmpeg pass.
+
+    The output format is fixed (16 kHz mono 16-bit by default), so the file is not probed
+    first: one process spawn and one container parse per video. A file without an audio
+    stream raises CouldntDecodeError when the first chunk is read.
+
+    Parameters
+    ----------
+    video_file : str
+        The path to the video (or audio) file.
+    chunk_length_ms : int
+        The length of each chunk in milliseconds.
+    frame_rate : int, optional
+        The output sample rate.
+    channels : int, optional
+        The output channel count.
+    sample_width : int, optional
+        The sample width in bytes (2 or 4).
+    start_ms : int, optional
+        The position of the first chunk in milliseconds.
+
+    Returns
+    -------
+    generator
+        AudioSegment chunks in order, decoded one at a time.
+    """
+    return stream_audio_chunks(video_file, chunk_length_ms, frame_rate, channels, sample_width, start_ms)
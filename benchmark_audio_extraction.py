@@ -0,0 +1,123 @@
+"""
+This script benchmarks the audio extraction stage of the transcription scripts on a list of videos.
+
+Methods compared (per video, chunks of 1 minute, no recognition):
+* legacy_parallel: VideoFileClip + AudioSegment.from_file + split_audio
+  (transcribe_parallel.py and transcript_hybrid.py before the single-pass extraction)
+* legacy_transcribe: AudioSegment.from_file + split_audio (transcribe.py before streaming)
+* single_pass: audio_stream.extract_audio (one ffmpeg process, 16 kHz mono PCM, streamed)
+
+Reported per method: mean wall time, mean CPU time of the ffmpeg child processes and the
+peak memory allocated by Python while the audio is held. Each video is read once before it is
+timed, and the order of the methods rotates per video.
+
+Usage: python benchmark_audio_extraction.py -f files.txt -n 20
+"""
+
+import os
+import time
+import resource
+import argparse
+import tracemalloc
+import audio_stream
+
+PATH = os.path.dirname(__file__)
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the audio extraction of the transcription scripts')
+    parser.add_argument('-f', '--file', help='The path to a txt file including video files', required=True)
+    parser.add_argument('-n', '--number', help='The number of videos to use', type=int, default=20)
+    return parser.parse_args()
+
+
+def split_audio(audio, chunk_length_ms):
+    return [audio[i:i + chunk_length_ms] for i in range(0, len(audio), chunk_length_ms)]
+
+
+def legacy_parallel(video_file):
+    from moviepy.editor import VideoFileClip
+    from pydub import AudioSegment
+    video = VideoFileClip(video_file)
+    audio = video.audio
+    audio_segment = AudioSegment.from_file(video_file, format="mp4")
+    video.close()
+    return sum(len(chunk.raw_data) for chunk in split_audio(audio_segment, 60000))
+
+
+def legacy_transcribe(video_file):
+    from pydub import AudioSegment
+    audio_segment = AudioSegment.from_file(video_file, format="mp4")
+    return sum(len(chunk.raw_data) for chunk in split_audio(audio_segment, 60000))
+
+
+def single_pass(video_file):
+    return sum(len(chunk.raw_data) for chunk in audio_stream.extract_audio(video_file, 60000))
+
+
+METHODS = [legacy_parallel, legacy_transcribe, single_pass]
+
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def warm_up(video_file):
+    """
+    Read a video file into the page cache.
+    """
+    with open(video_file, 'rb') as f:
+        while f.read(1024 ** 2):
+            pass
+
+
+def measure(method, video_file):
+    """
+    Run one method on one video. Returns (wall seconds, child CPU seconds, peak MB, PCM MB).
+    """
+    cpu = child_cpu()
+    tracemalloc.start()
+    start = time.perf_counter()
+    pcm_bytes = method(video_file)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return wall, child_cpu() - cpu, peak / 1024 ** 2, pcm_bytes / 1024 ** 2
+
+
+def main():
+    args = get_args()
+    with open(args.file, 'r') as f:
+        video_files = [line.strip().replace("\\", "/") for line in f if line.strip()][:args.number]
+    print(f"Benchmarking {len(video_files)} videos")
+
+    totals = {method.__name__: [0.0, 0.0, 0.0, 0.0] for method in METHODS}
+    for k, video_file in enumerate(video_files):
+        # read the video once before timing, so the first method does not pay for the cold page cache,
+        # and rotate the order of the methods per video so none of them always runs first
+        warm_up(video_file)
+        for method in METHODS[k % len(METHODS):] + METHODS[:k % len(METHODS)]:
+            try:
+                result = measure(method, video_file)
+            except Exception as e:
+                print(f"{method.__name__} failed on {video_file}: {e}")
+                continue
+            for i, value in enumerate(result):
+                totals[method.__name__][i] += value
+
+    n = max(1, len(video_files))
+    print(f"{'method':<20}{'wall s/video':>14}{'ffmpeg cpu s':>14}{'peak MB':>10}{'pcm MB':>10}")
+    for name, (wall, cpu, peak, pcm) in totals.items():
+        print(f"{name:<20}{wall / n:>14.3f}{cpu / n:>14.3f}{peak / n:>10.1f}{pcm / n:>10.1f}")
+    baseline = totals['legacy_parallel'][0]
+    if baseline:
+        for name, values in totals.items():
+            print(f"{name}: {100 * (1 - values[0] / baseline):.1f}% less wall time than legacy_parallel")
+
+
+if __name__ == '__main__':
+    main()
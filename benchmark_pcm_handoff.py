@@ -0,0 +1,79 @@
+"""
+This script is a microbenchmark of the handoff of an audio chunk to the recognizer.
+
+* wav_roundtrip: chunk.export(BytesIO, format="wav") + sr.AudioFile + recognizer.record
+  (transcribe_chunk before the direct path)
+* direct: recognizers.audio_data(recognizers.pcm_chunk(chunk)) (AudioData built on the sample buffer)
+
+Both produce the AudioData that is sent to the recognizer; the recognition itself is not run.
+Reported per chunk: mean time and peak memory allocated by Python.
+
+Usage: python benchmark_pcm_handoff.py -n 50 -l 60000
+"""
+
+import io
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import speech_recognition as sr
+from pydub import AudioSegment
+import recognizers
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the PCM handoff from chunks to the recognizer')
+    parser.add_argument('-n', '--number', help='The number of chunks per format', type=int, default=50)
+    parser.add_argument('-l', '--length', help='The chunk length in milliseconds', type=int, default=60000)
+    return parser.parse_args()
+
+
+def wav_roundtrip(chunk):
+    recognizer = sr.Recognizer()
+    chunk_io = io.BytesIO()
+    chunk.export(chunk_io, format="wav")
+    chunk_io.seek(0)
+    with sr.AudioFile(chunk_io) as source:
+        return recognizer.record(source)
+
+
+def direct(chunk):
+    return recognizers.audio_data(recognizers.pcm_chunk(chunk))
+
+
+def make_chunk(length_ms, frame_rate, channels):
+    samples = np.random.RandomState(0).randint(-3000, 3000, frame_rate * length_ms // 1000 * channels)
+    return AudioSegment(data=samples.astype('<i2').tobytes(), sample_width=2, frame_rate=frame_rate, channels=channels)
+
+
+def measure(method, chunk, number):
+    """
+    Returns (mean ms per chunk, peak MB allocated while handling one chunk).
+    """
+    method(chunk)  # warm up
+    start = time.perf_counter()
+    for _ in range(number):
+        method(chunk)
+    elapsed = (time.perf_counter() - start) / number
+    tracemalloc.start()
+    method(chunk)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return 1000 * elapsed, peak / 1024 ** 2
+
+
+def main():
+    args = get_args()
+    print(f"{'format':<16}{'method':<16}{'ms/chunk':>10}{'peak MB':>10}")
+    for frame_rate, channels in [(16000, 1), (44100, 2)]:
+        chunk = make_chunk(args.length, frame_rate, channels)
+        for method in [wav_roundtrip, direct]:
+            elapsed, peak = measure(method, chunk, args.number)
+            print(f"{f'{frame_rate} Hz x{channels}':<16}{method.__name__:<16}{elapsed:>10.2f}{peak:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
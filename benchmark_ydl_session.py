@@ -0,0 +1,62 @@
+"""
+This script is a benchmark of the per-video overhead of yt-dlp against the local fixture server.
+
+* per_call: a new YoutubeDL for every video (download_video before ydl_session)
+* session: one YoutubeDL reused for every video (ydl_session.get_session)
+
+The videos are small and the server answers at once, so the time per video is mostly the
+startup overhead of the downloader. Reported: mean ms per video and the total wall time.
+
+Usage: python benchmark_ydl_session.py -n 50 --size 64
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import yt_dlp as youtube_dl
+import ydl_session
+from download_fixture_server import serve
+
+# quiet: the progress output would dominate the timings
+OPTS = {'format': 'best', 'noplaylist': True, 'quiet': True, 'noprogress': True}
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark YoutubeDL reuse against the fixture server')
+    parser.add_argument('-n', '--number', help='The number of videos per method', type=int, default=50)
+    parser.add_argument('--size', help='The size of each video in KB', type=int, default=64)
+    return parser.parse_args()
+
+
+def per_call(url, output_path):
+    with youtube_dl.YoutubeDL(dict(OPTS, outtmpl=output_path)) as ydl:
+        ydl.download([url])
+
+
+def session(url, output_path):
+    ydl_session.get_session(OPTS).download(url, outtmpl=output_path)
+
+
+def main():
+    args = get_args()
+    server = serve(0, args.size)
+    base_url = f"http://127.0.0.1:{server.server_port}/videos"
+    print(f"{'method':<12}{'ms/video':>10}{'total s':>10}")
+    for method in [per_call, session]:
+        with tempfile.TemporaryDirectory() as output_dir:
+            method(f"{base_url}/warmup.mp4", os.path.join(output_dir, 'warmup.mp4'))
+            start = time.perf_counter()
+            for i in range(args.number):
+                method(f"{base_url}/{method.__name__}{i}.mp4", os.path.join(output_dir, f"{i}.mp4"))
+            elapsed = time.perf_counter() - start
+            assert len(os.listdir(output_dir)) == args.number + 1
+        print(f"{method.__name__:<12}{1000 * elapsed / args.number:>10.1f}{elapsed:>10.2f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+This file keeps a per-video journal of recognized chunks so an interrupted video resumes mid-file.
+
+The journal is a sidecar file next to the output transcript (<video_id>.txt.journal) with one JSON
+line per recognized chunk, appended as soon as the chunk is done. A restarted run loads it, only
+recognizes the missing chunk indices, then writes the final .txt atomically (temporary file +
+rename) and deletes the journal.
+
+The first line records how the audio was chunked; a journal written with other settings
+(chunk length, VAD, sample format) is discarded because its indices mean different audio.
+"""
+
+import os
+import json
+import logging
+import threading
+
+
+class IncompleteTranscriptError(Exception):
+    """
+    Some chunks of a video could not be recognized; the journal is kept so a rerun only retries them.
+    """
+    def __init__(self, video_id, failed):
+        self.video_id = video_id
+        self.failed = sorted(failed)
+        super().__init__(f"{len(self.failed)} chunks failed: {video_id} - {self.failed}")
+
+
+class ChunkJournal:
+    """
+    The journal of one video.
+
+    Parameters
+    ----------
+    transcript_file : str
+        The path of the final transcript; the journal is stored next to it.
+    params : dict
+        The chunking settings (JSON serializable); must match to resume from the journal.
+    """
+    def __init__(self, transcript_file, params):
+        self.transcript_file = transcript_file
+        self.path = transcript_file + '.journal'
+        self.params = params
+        self.done = self._load()
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        done = {}
+        if not os.path.isfile(self.path):
+            return done
+        with open(self.path, 'r') as f:
+            lines = f.read().splitlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            header = None
+        if not header or header.get('params') != self.params:
+            logging.info(f"Discarding journal with different settings: {self.path}")
+            return done
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # a line torn by a crash; everything before it is valid
+            done[entry['index']] = entry['transcript']
+        logging.info(f"Resuming from journal: {self.path} ({len(done)} chunks done)")
+        return done
+
+    def first_missing(self):
+        """
+        The smallest chunk index that is not in the journal.
+        """
+        index = 0
+        while index in self.done:
+            index += 1
+        return index
+
+    def append(self, index, transcript):
+        """
+        Record a recognized chunk (thread safe). The line is on disk when this returns.
+        """
+        with self._lock:
+            if self._file is None:
+                # rewrite the journal (header and the chunks that were loaded, without a torn last line)
+                # through a temporary file, so a crash here never loses the chunks already journaled
+                temp_file = self.path + '.tmp'
+                with open(temp_file, 'w') as f:
+                    f.write(json.dumps({'params': self.params}) + '\n')
+                    for i, text in sorted(self.done.items()):
+                        f.write(json.dumps({'index': i, 'transcript': text}) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.path)
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps({'index': index, 'transcript': transcript}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.done[index] = transcript
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        """
+        Delete the journal (the transcript was saved elsewhere, e.g. in the transcript store).
+        """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def commit(self, full_transcript):
+        """
+        Write the final transcript atomically and delete the journal.
+        """
+        self.close()
+        temp_file = self.transcript_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            f.write(full_transcript)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.transcript_file)
+        if os.path.exists(self.path):
+            os.remove(self.path)
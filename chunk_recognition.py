@@ -0,0 +1,239 @@
+"""
+This file runs the recognition of the audio chunks of one video concurrently.
+
+It is shared by transcribe_parallel.py and transcript_hybrid.py:
+* a bounded thread pool per process (at most `window` chunks are decoded and waiting at once)
+* an optional global in-flight limit shared by all worker processes (multiprocessing semaphore)
+* an optional token-bucket rate limiter shared by all worker processes
+Results always come back in chunk order, and errors are reported per chunk instead of
+failing the whole video. Chunks that are already done (chunk_journal) are skipped.
+With batch_size, consecutive chunks are recognized in one call (Recognizer.recognize_batch).
+"""
+
+import os
+import time
+import logging
+import multiprocessing
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+# the shared limits are created in the spawn context: they can be inherited by forked workers and
+# passed to spawned ones (worker pools with max_tasks_per_child start their processes with spawn)
+_CONTEXT = multiprocessing.get_context('spawn')
+
+# transcript is "" when the chunk failed; error holds the exception (None on success)
+ChunkResult = namedtuple('ChunkResult', ['index', 'transcript', 'error'])
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter that can be shared between threads and processes.
+
+    Parameters
+    ----------
+    rate : float
+        The number of tokens added per second (i.e. requests per second).
+    capacity : float, optional
+        The size of the bucket (the largest burst). Defaults to max(1, rate).
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive: {rate}")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        # [tokens, last refill time]; lives in shared memory so forked/spawned workers see one bucket
+        self._state = _CONTEXT.RawArray('d', [self.capacity, time.monotonic()])
+        self._lock = _CONTEXT.Lock()
+
+    def acquire(self, tokens=1.0):
+        """
+        Block until `tokens` tokens are available and take them.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                available = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+                self._state[1] = now
+                if available >= tokens:
+                    self._state[0] = available - tokens
+                    return
+                self._state[0] = available
+                wait = (tokens - available) / self.rate
+            time.sleep(wait)
+
+
+# process-wide limits, set by configure() (e.g. as a ProcessPoolExecutor initializer)
+_LIMITER = None
+_IN_FLIGHT = None
+
+
+def configure(limiter=None, in_flight=None):
+    """
+    Set the rate limiter and the global in-flight semaphore used by this process.
+
+    Parameters
+    ----------
+    limiter : TokenBucket, optional
+        The rate limiter shared by all processes.
+    in_flight : multiprocessing.Semaphore, optional
+        Limits the number of chunks being recognized at once across all processes.
+    """
+    global _LIMITER, _IN_FLIGHT
+    _LIMITER = limiter
+    _IN_FLIGHT = in_flight
+
+
+def make_limits(max_in_flight=None, rate=None):
+    """
+    Create the shared limits for configure() from the command line options.
+
+    Returns
+    -------
+    tuple
+        (limiter, in_flight), either may be None when the limit is not set.
+    """
+    limiter = TokenBucket(rate) if rate else None
+    in_flight = _CONTEXT.BoundedSemaphore(max_in_flight) if max_in_flight else None
+    return limiter, in_flight
+
+
+def _recognize(transcribe, chunk, index, on_result=None):
+    if _LIMITER is not None:
+        _LIMITER.acquire()
+    if _IN_FLIGHT is not None:
+        _IN_FLIGHT.acquire()
+    try:
+        _, transcript = transcribe(chunk, index)
+    except Exception as e:
+        return ChunkResult(index, "", e)
+    finally:
+        if _IN_FLIGHT is not None:
+            _IN_FLIGHT.release()
+    if on_result is not None:
+        on_result(index, transcript)
+    return ChunkResult(index, transcript, None)
+
+
+def _recognize_batch(transcribe, batch, on_result=None):
+    # a batch is one request for the rate limiter and the in-flight limit
+    indices = [index for index, _ in batch]
+    if _LIMITER is not None:
+        _LIMITER.acquire()
+    if _IN_FLIGHT is not None:
+        _IN_FLIGHT.acquire()
+    try:
+        transcripts = transcribe([chunk for _, chunk in batch], indices)
+    except Exception as e:
+        transcripts = [e] * len(batch)
+    finally:
+        if _IN_FLIGHT is not None:
+            _IN_FLIGHT.release()
+    results = []
+    for index, transcript in zip(indices, transcripts):
+        if isinstance(transcript, Exception):
+            results.append(ChunkResult(index, "", transcript))
+            continue
+        if on_result is not None:
+            on_result(index, transcript)
+        results.append(ChunkResult(index, transcript, None))
+    return results
+
+
+def _batches(chunks, start, done, batch_size):
+    # in chunk order: the ChunkResult of each chunk that is done, and lists of up to batch_size
+    # consecutive (index, chunk) pairs to recognize
+    batch = []
+    for i, chunk in enumerate(chunks, start):
+        if i in done:
+            if batch:
+                yield batch
+                batch = []
+            yield ChunkResult(i, done[i], None)
+        else:
+            batch.append((i, chunk))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def recognize_chunks(chunks, transcribe, max_workers=None, window=None, start=0, done=None, on_result=None, batch_size=None):
+    """
+    Recognize audio chunks concurrently and return the results in order.
+
+    Parameters
+    ----------
+    chunks : iterable
+        The audio chunks (may be a generator, e.g. from audio_stream.stream_audio_chunks).
+    transcribe : callable
+        transcribe(chunk, index) -> (index, transcript), e.g. transcribe_chunk.
+        With batch_size: transcribe(chunks, indices) -> the transcript of each chunk, or the
+        exception that failed it, e.g. transcription.transcribe_chunks.
+    max_workers : int, optional
+        The number of chunks (or batches) recognized at once in this process. 1 runs sequentially.
+        Defaults to the ThreadPoolExecutor default.
+    window : int, optional
+        The maximum number of chunks (or batches) submitted but not yet collected. Defaults to
+        2 * max_workers. This keeps memory bounded when `chunks` is a stream.
+    start : int, optional
+        The index of the first chunk of `chunks` (when the stream starts mid-file).
+    done : dict, optional
+        index -> transcript of the chunks that are already recognized (e.g. from a ChunkJournal).
+        They are not recognized again, and must include every index below `start`.
+    on_result : callable, optional
+        on_result(index, transcript), called from the worker as soon as a chunk is recognized
+        successfully (e.g. ChunkJournal.append).
+    batch_size : int, optional
+        Recognize up to batch_size consecutive chunks per call of `transcribe` (e.g. the
+        batch_size of the recognizer). Defaults to one chunk per call of transcribe(chunk, index).
+
+    Returns
+    -------
+    list of ChunkResult
+        One result per chunk, sorted by index.
+    """
+    done = done or {}
+    results = [ChunkResult(i, done[i], None) for i in range(start)]
+    def recognize(batch):
+        if batch_size is None:
+            # one chunk per call of transcribe(chunk, index)
+            (index, chunk), = batch
+            return [_recognize(transcribe, chunk, index, on_result)]
+        return _recognize_batch(transcribe, batch, on_result)
+
+    batches = _batches(chunks, start, done, batch_size or 1)
+
+    if max_workers == 1:
+        for batch in batches:
+            results.extend([batch] if isinstance(batch, ChunkResult) else recognize(batch))
+        return results
+
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+    window = window or 2 * max_workers
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in batches:
+            if len(pending) >= window:
+                # collect the oldest batch first so the results stay in order
+                results.extend(pending.popleft().result())
+            if isinstance(batch, ChunkResult):
+                future = Future()
+                future.set_result([batch])
+            else:
+                future = executor.submit(recognize, batch)
+            pending.append(future)
+        for future in pending:
+            results.extend(future.result())
+    return results
+
+
+def join_results(results, video_id):
+    """
+    Join the chunk transcripts into one transcript and log the failed chunks.
+    """
+    for result in results:
+        if result.error is not None:
+            logging.error(f"Chunk {result.index} failed: {video_id} - {type(result.error).__name__}: {result.error}")
+    return " ".join([result.transcript for result in results])
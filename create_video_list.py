@@ -11,7 +11,8 @@ def main():
     for root, dirs, files in os.walk(args.directory):
         for file in files:
             #print(os.path.join(root, file))
-            if file.endswith('.mp4') or file.endswith('.mkv') or file.endswith('.avi'):
+            # .m4a: audio-only downloads (video_download.py --audio-only)
+            if file.endswith('.mp4') or file.endswith('.mkv') or file.endswith('.avi') or file.endswith('.m4a'):
                 video_files.append(os.path.join(root, file))
 
     print('Found {} video files'.format(len(video_files)))
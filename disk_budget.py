@@ -0,0 +1,262 @@
+"""
+This file keeps the downloaded media within a disk quota, so a box with a bounded disk can process an unbounded queue.
+
+* the size of the media folders is tracked (one scan, then the downloads and evictions are
+  counted; rescanned every few minutes)
+* downloads wait before they start while the media is above the high watermark of the quota
+  (or the disk has less than min_free bytes free)
+* media is evicted once the manifest confirms that its transcript was written ('transcribe'
+  stage done), oldest first, until the media is below the low watermark. Evicting deletes the
+  file, or compacts it into a small speech-quality opus file (mode 'compact'); the compact files
+  count toward the quota and are deleted as a last resort when compacting does not free enough
+* a download that waited max_wait seconds for room logs an error and starts anyway, instead of
+  waiting forever for evictions that cannot come
+The pipeline also evicts each video as soon as it is transcribed.
+
+The quota has to leave room for the downloads that are in flight and the videos waiting for
+transcription (roughly (concurrency + queue size + workers) x the size of a video), otherwise
+the downloads wait for evictions that can only come from those videos.
+
+Usage: python disk_budget.py -d videos/Creators videos/Sponsors --quota 50 --mode delete
+"""
+
+import os
+import time
+import shutil
+import logging
+import argparse
+import threading
+import subprocess
+from pydub import AudioSegment
+import manifest
+import shared_state
+
+# the media files that are counted and may be evicted
+MEDIA_EXTENSIONS = ('.mp4', '.m4a', '.mkv', '.avi', '.webm')
+COMPACT_EXT = '.opus'
+MODES = ('delete', 'compact')
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Evict the transcribed videos until the media fits in the quota')
+    parser.add_argument('-d', '--directories', help='The media folders', nargs='+', required=True)
+    parser.add_argument('--quota', help='The disk quota of the media in GB', type=float, required=True)
+    parser.add_argument('--mode', help='Delete the transcribed media or compact it to opus', choices=MODES, default='delete')
+    parser.add_argument('--manifest', help='The path to the manifest database (SQLite file)',
+                        default=os.path.join(os.path.dirname(__file__), 'manifest.db'))
+    return parser.parse_args()
+
+
+def compact(media_file, bitrate='16k'):
+    """
+    Re-encode the audio of a media file as mono 16 kHz opus (speech quality) and delete the original.
+
+    Returns
+    -------
+    str
+        The path to the compact file.
+    """
+    compact_file = os.path.splitext(media_file)[0] + COMPACT_EXT
+    command = [AudioSegment.converter, '-nostdin', '-v', 'error', '-y', '-i', media_file,
+               '-map', '0:a:0', '-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', bitrate,
+               '-f', 'opus', compact_file + '.tmp']
+    subprocess.run(command, check=True, capture_output=True)
+    os.replace(compact_file + '.tmp', compact_file)
+    os.remove(media_file)
+    return compact_file
+
+
+class DiskBudget:
+    """
+    The disk quota of the media folders.
+
+    Parameters
+    ----------
+    directories : list
+        The media folders (the downloads are written there).
+    quota : int
+        The maximum size of the media in bytes.
+    high : float, optional
+        Downloads wait while the media is above high * quota.
+    low : float, optional
+        Eviction stops below low * quota.
+    mode : str, optional
+        'delete' or 'compact' the evicted media.
+    min_free : int, optional
+        Downloads also wait while the disk has less than min_free bytes free.
+    rescan : float, optional
+        Scan the folders again after this many seconds (the files may change behind our back).
+    max_wait : float, optional
+        The longest a download waits for room, in seconds (None waits until there is room).
+    """
+    def __init__(self, directories, quota, high=0.9, low=0.8, mode='delete', min_free=0, rescan=300, max_wait=3600):
+        if mode not in MODES:
+            raise ValueError(f"Unknown eviction mode: {mode}")
+        self.directories = [directories] if isinstance(directories, str) else list(directories)
+        self.quota = quota
+        self.high = high
+        self.low = low
+        self.mode = mode
+        self.min_free = min_free
+        self.rescan = rescan
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        # one thread evicts at a time (the download threads and the pipeline evict concurrently);
+        # reentrant because evict() calls evict_file()
+        self._evicting = threading.RLock()
+        self._used = None
+        self._scanned = 0.0
+
+    def _media(self):
+        # (mtime, size, path, video_id) of every media file
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.is_file() and entry.name.endswith(MEDIA_EXTENSIONS + (COMPACT_EXT,)):
+                    stat = entry.stat()
+                    yield stat.st_mtime, stat.st_size, entry.path, os.path.splitext(entry.name)[0]
+
+    def used(self):
+        """
+        The size of the media in bytes.
+        """
+        with self._lock:
+            if self._used is None or time.time() - self._scanned > self.rescan:
+                self._used = sum(size for _, size, _, _ in self._media())
+                self._scanned = time.time()
+            return self._used
+
+    def added(self, nbytes):
+        """
+        Count a finished download.
+        """
+        with self._lock:
+            if self._used is not None:
+                self._used += nbytes or 0
+
+    def _free(self):
+        free = min((shutil.disk_usage(d).free for d in self.directories if os.path.isdir(d)), default=None)
+        return free is None or free >= self.min_free
+
+    def has_room(self):
+        """
+        Whether a download may start (below the high watermark and enough free disk).
+        """
+        return self.used() < self.high * self.quota and self._free()
+
+    def evict_file(self, media_file, mode=None):
+        """
+        Delete or compact one media file (mode defaults to the mode of the budget; compact files are only deleted).
+
+        Returns
+        -------
+        int
+            The bytes freed.
+        """
+        mode = mode or self.mode
+        with self._evicting:
+            if not os.path.isfile(media_file):
+                return 0
+            size = os.path.getsize(media_file)
+            if mode == 'compact' and not media_file.endswith(COMPACT_EXT):
+                freed = size - os.path.getsize(compact(media_file))
+            elif mode == 'delete':
+                os.remove(media_file)
+                freed = size
+            else:
+                return 0
+        with self._lock:
+            if self._used is not None:
+                self._used -= freed
+        logging.info(f"Evicted ({mode}): {media_file}, {freed / 1024 ** 2:.1f} MB freed")
+        return freed
+
+    def evict(self, target=None):
+        """
+        Evict the transcribed media (manifest), oldest first, until the media is below target bytes (default low * quota).
+
+        Returns
+        -------
+        int
+            The bytes freed.
+        """
+        target = self.low * self.quota if target is None else target
+        tracker = manifest.get_manifest()
+        if tracker is None:
+            return 0
+        # the other threads wait here, then find the media below the target and return
+        with self._evicting:
+            if self.used() <= target:
+                return 0
+            transcribed = tracker.done('transcribe')
+            media = sorted(self._media())
+            freed = 0
+            # the media first (deleted or compacted), then the compact files (deleted) as a last resort
+            for compacted in (False, True):
+                for _, size, path, video_id in media:
+                    if self.used() <= target:
+                        return freed
+                    if video_id in transcribed and path.endswith(COMPACT_EXT) == compacted:
+                        try:
+                            freed += self.evict_file(path, 'delete' if compacted else None)
+                        except (OSError, subprocess.CalledProcessError) as e:
+                            logging.error(f"Eviction failed: {path} - {type(e).__name__}: {e}")
+            return freed
+
+    def wait_for_room(self, poll=10.0):
+        """
+        Block until a download may start (or max_wait seconds passed), evicting the transcribed media in the meantime.
+        """
+        waited = 0.0
+        while not self.has_room():
+            self.evict()
+            if self.has_room():
+                break
+            if self.max_wait is not None and waited >= self.max_wait:
+                logging.error(f"Disk quota still reached after {waited:.0f}s ({self.used() / 1024 ** 3:.1f} of "
+                              f"{self.quota / 1024 ** 3:.1f} GB) and no transcribed media left to evict: downloading anyway")
+                break
+            if waited % 300 < poll:
+                logging.warning(f"Disk quota reached ({self.used() / 1024 ** 3:.1f} of {self.quota / 1024 ** 3:.1f} GB): "
+                                f"downloads wait for transcriptions")
+            time.sleep(poll)
+            waited += poll
+        return waited
+
+
+# process-wide budget: configure(directories, quota, **options) enables it (quota=None disables it),
+# get_budget() returns it or None
+_BUDGET = shared_state.ProcessGlobal(lambda directories=None, quota=None, **options:
+                                     DiskBudget(directories, quota, **options) if quota else None)
+configure = _BUDGET.configure
+get_budget = _BUDGET.get
+
+
+# shortcuts for the scripts: no-ops when the budget is disabled
+def wait_for_room():
+    if get_budget() is not None:
+        get_budget().wait_for_room()
+
+
+def added(nbytes):
+    if get_budget() is not None:
+        get_budget().added(nbytes)
+
+
+def transcribed(media_file):
+    if get_budget() is not None:
+        get_budget().evict_file(media_file)
+
+
+if __name__ == '__main__':
+    args = get_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    manifest.configure(args.manifest)
+    budget = DiskBudget(args.directories, int(args.quota * 1024 ** 3), mode=args.mode)
+    print(f"Media: {budget.used() / 1024 ** 3:.2f} GB of {args.quota:.2f} GB")
+    freed = budget.evict()
+    print(f"Freed: {freed / 1024 ** 3:.2f} GB, media: {budget.used() / 1024 ** 3:.2f} GB")
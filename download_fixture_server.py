@@ -0,0 +1,130 @@
+"""
+This file is a local HTTP stand-in for the video hosts, so the downloaders can be tested and tuned offline.
+
+Every GET path is a "video": a deterministic blob of a fixed size served as video/mp4, after an
+optional latency and at an optional bandwidth per connection. Paths starting with /error/ return
+the given status code (e.g. /error/429/abc.mp4) to exercise the error handling.
+yt-dlp treats the URLs as direct media links (generic extractor).
+
+Usage: python download_fixture_server.py -p 8000 --size 2048 --latency 0.2
+       then e.g. http://127.0.0.1:8000/videos/123.mp4
+"""
+
+import sys
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Serve fake videos over HTTP')
+    parser.add_argument('-p', '--port', help='The port to listen on', type=int, default=8000)
+    parser.add_argument('--size', help='The size of each video in KB', type=int, default=2048)
+    parser.add_argument('--latency', help='The delay before each response in seconds', type=float, default=0.0)
+    parser.add_argument('--bandwidth', help='The bandwidth per connection in KB/s (0 = unlimited)', type=int, default=0)
+    return parser.parse_args()
+
+
+def video_bytes(path, size):
+    """
+    The content of a fake video: deterministic per path, so downloads can be verified.
+    """
+    block = hashlib.sha256(path.encode()).digest() * 2048   # 64 KB
+    return (block * (size // len(block) + 1))[:size]
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    # set by serve()
+    size = 2048 * 1024
+    latency = 0.0
+    bandwidth = 0
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the real hosts
+
+    def log_message(self, format, *args):
+        pass
+
+    def _status(self):
+        parts = self.path.strip('/').split('/')
+        if parts[0] == 'error' and len(parts) > 1 and parts[1].isdigit():
+            return int(parts[1])
+        return 200
+
+    def _headers(self):
+        status = self._status()
+        if self.latency:
+            time.sleep(self.latency)
+        if status != 200:
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(self.size))
+        self.end_headers()
+        return video_bytes(self.path, self.size)
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        data = self._headers()
+        if data is None:
+            return
+        step = 64 * 1024
+        for i in range(0, len(data), step):
+            self.wfile.write(data[i:i + step])
+            if self.bandwidth:
+                time.sleep(step / self.bandwidth)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients may hang up early (e.g. the yt-dlp generic extractor only reads the headers)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(port=0, size_kb=2048, latency=0.0, bandwidth_kb=0):
+    """
+    Start the fixture server in a background thread.
+
+    Parameters
+    ----------
+    port : int, optional
+        The port to listen on (0 picks a free port).
+    size_kb : int, optional
+        The size of each video in KB.
+    latency : float, optional
+        The delay before each response in seconds.
+    bandwidth_kb : int, optional
+        The bandwidth per connection in KB/s (0 = unlimited).
+
+    Returns
+    -------
+    FixtureServer
+        The running server; the base URL is f"http://127.0.0.1:{server.server_port}". Call shutdown() to stop it.
+    """
+    handler = type('Handler', (FixtureHandler,), {'size': size_kb * 1024, 'latency': latency,
+                                                   'bandwidth': bandwidth_kb * 1024})
+    server = FixtureServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    args = get_args()
+    server = serve(args.port, args.size, args.latency, args.bandwidth)
+    print(f"Serving fake videos on http://127.0.0.1:{server.server_port}/ (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,223 @@
+"""
+This file runs many video downloads at once with asyncio, for video_download.py.
+
+Downloading is waiting on the network, so the concurrency is not tied to the CPU count:
+* a fixed number of worker coroutines (the concurrency limit) pull the jobs from an iterator,
+  so hundreds of downloads can run on a small box and the job list is never copied
+* a token bucket per host limits the request rate to each host
+* a random jitter before each download keeps the workers from hitting a host in lockstep
+* the blocking download function (e.g. download_video with yt-dlp) runs in a thread pool
+  sized to the concurrency limit
+The throughput (videos/s, MB/s) is logged periodically and at the end, so the limits can be tuned.
+
+Usage (offline, against download_fixture_server.py):
+    python download_orchestrator.py -n 500 -c 200 --rate 50 --jitter 0.1 --latency 0.2
+"""
+
+import os
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import urllib.request
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from job_scheduler import JobResult
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Run fake downloads against the local fixture server')
+    parser.add_argument('-n', '--number', help='The number of downloads', type=int, default=500)
+    parser.add_argument('-c', '--concurrency', help='The number of downloads at once', type=int, default=64)
+    parser.add_argument('--rate', help='The requests per second per host (0 = unlimited)', type=float, default=0)
+    parser.add_argument('--jitter', help='The maximum random delay before each download in seconds', type=float, default=0.1)
+    parser.add_argument('--hosts', help='The number of fake hosts (fixture servers)', type=int, default=2)
+    parser.add_argument('--size', help='The size of each video in KB', type=int, default=512)
+    parser.add_argument('--latency', help='The delay before each response in seconds', type=float, default=0.2)
+    return parser.parse_args()
+
+
+class AsyncTokenBucket:
+    """
+    Token-bucket rate limiter for the coroutines of one event loop.
+
+    Parameters
+    ----------
+    rate : float
+        The number of tokens added per second (i.e. requests per second).
+    capacity : float, optional
+        The size of the bucket (the largest burst). Defaults to max(1, rate).
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive: {rate}")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    async def acquire(self, tokens=1.0):
+        """
+        Wait until `tokens` tokens are available and take them.
+        """
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class Throughput:
+    """
+    The throughput of a batch of downloads.
+    """
+    def __init__(self):
+        self.start = time.monotonic()
+        self.end = None
+        self.completed = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def add(self, ok, nbytes=0):
+        if ok:
+            self.completed += 1
+            self.bytes += nbytes
+        else:
+            self.failed += 1
+
+    def report(self, final=False):
+        """
+        Log the throughput (and return the report line).
+        """
+        if final and self.end is None:
+            self.end = time.monotonic()
+        elapsed = max((self.end or time.monotonic()) - self.start, 1e-9)
+        line = (f"{'Downloads finished' if final else 'Downloads'}: {self.completed} completed, {self.failed} failed "
+                f"in {elapsed:.1f}s ({self.completed / elapsed:.2f} videos/s, {self.bytes / 1024 ** 2 / elapsed:.2f} MB/s)")
+        logging.info(line)
+        return line
+
+
+def host_of(url):
+    """
+    The host a URL is rate limited by (host:port).
+    """
+    return urlparse(url).netloc.lower()
+
+
+async def _worker(download, jobs, executor, limiters, stats, rate, burst, jitter, results):
+    loop = asyncio.get_running_loop()
+    # jobs is a plain iterator shared by the workers (next() never awaits, so it is safe)
+    for job in jobs:
+        if jitter:
+            await asyncio.sleep(random.uniform(0, jitter))
+        if rate:
+            host = host_of(job[0])
+            if host not in limiters:
+                limiters[host] = AsyncTokenBucket(rate, burst)
+            await limiters[host].acquire()
+        try:
+            result = await loop.run_in_executor(executor, download, *job)
+        except Exception as e:
+            stats.add(False)
+            results.append(JobResult(job, None, e))
+            continue
+        ok = result is not False
+        output_path = job[2] if len(job) > 2 else None
+        stats.add(ok, os.path.getsize(output_path) if ok and output_path and os.path.isfile(output_path) else 0)
+        results.append(JobResult(job, result, None))
+
+
+async def _reporter(stats, every):
+    while True:
+        await asyncio.sleep(every)
+        stats.report()
+
+
+async def orchestrate(download, jobs, concurrency=64, rate=None, burst=None, jitter=0.5, report_every=30):
+    """
+    Run the downloads on the running event loop. See run_downloads.
+    """
+    stats = Throughput()
+    results = []
+    limiters = {}
+    jobs = iter(jobs)
+    reporter = asyncio.ensure_future(_reporter(stats, report_every)) if report_every else None
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='download') as executor:
+        await asyncio.gather(*[_worker(download, jobs, executor, limiters, stats, rate, burst, jitter, results)
+                               for _ in range(concurrency)])
+    if reporter is not None:
+        reporter.cancel()
+    stats.report(final=True)
+    return results, stats
+
+
+def run_downloads(download, jobs, concurrency=64, rate=None, burst=None, jitter=0.5, report_every=30):
+    """
+    Download many videos at once.
+
+    Parameters
+    ----------
+    download : callable
+        download(*job) -> status, a blocking download function, e.g. download_video(url, video_id, output_path).
+        A status of False (or an exception) counts as a failed download.
+    jobs : iterable
+        The argument tuples of download; the first item is the URL and the third (if any) the output path,
+        whose size is counted in the throughput.
+    concurrency : int, optional
+        The maximum number of downloads at once.
+    rate : float, optional
+        The maximum number of downloads started per second per host. None is unlimited.
+    burst : float, optional
+        The largest burst per host. Defaults to max(1, rate).
+    jitter : float, optional
+        The maximum random delay in seconds before each download.
+    report_every : float, optional
+        Log the throughput every this many seconds (0 = only at the end).
+
+    Returns
+    -------
+    tuple
+        (results, stats): a JobResult per job in the order they finished, and the Throughput.
+    """
+    return asyncio.run(orchestrate(download, jobs, concurrency, rate, burst, jitter, report_every))
+
+
+def fetch_url(url, video_id=None, output_path=None):
+    """
+    Download a URL to a file with urllib (a minimal download function for the fixture server).
+    """
+    with urllib.request.urlopen(url, timeout=60) as response, open(output_path + '.part', 'wb') as f:
+        shutil.copyfileobj(response, f, 1024 * 1024)
+    os.replace(output_path + '.part', output_path)
+    return True
+
+
+def main():
+    from download_fixture_server import serve
+    args = get_args()
+    servers = [serve(0, args.size, args.latency) for _ in range(args.hosts)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        jobs = [(f"http://127.0.0.1:{servers[i % len(servers)].server_port}/videos/{i}.mp4", str(i),
+                 os.path.join(output_dir, f"{i}.mp4")) for i in range(args.number)]
+        results, stats = run_downloads(fetch_url, jobs, args.concurrency, args.rate or None,
+                                       jitter=args.jitter, report_every=5)
+    for server in servers:
+        server.shutdown()
+    errors = [result for result in results if result.error is not None]
+    if errors:
+        print(f"First error: {type(errors[0].error).__name__}: {errors[0].error}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,149 @@
+"""
+This file retries failed downloads according to the kind of failure.
+
+An error is classified by the HTTP status in its cause chain, its exception type and its message
+(in this order, so that e.g. a missing ffmpeg is a postprocess error, not a missing video):
+* throttled: HTTP 429, rate limits; retried with long backoffs
+* transient: timeouts, dropped connections, HTTP 5xx/403; retried
+* permanent: removed, private or unsupported videos, HTTP 404/410; never retried, the video
+  becomes a dead letter in the manifest and later runs skip it
+* postprocess: ffmpeg failures after the download; retried once
+* unknown: anything else; retried once
+Each class has its own retry budget and base delay; the delay doubles with every attempt
+(capped, with jitter so the workers do not retry in lockstep).
+"""
+
+import re
+import time
+import random
+import socket
+import logging
+import http.client
+import yt_dlp as youtube_dl
+import manifest
+
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+POSTPROCESS = 'postprocess'
+UNKNOWN = 'unknown'
+
+# class -> (retries, base delay in seconds)
+BUDGETS = {
+    THROTTLED: (5, 30.0),
+    TRANSIENT: (3, 5.0),
+    POSTPROCESS: (1, 1.0),
+    UNKNOWN: (1, 5.0),
+    PERMANENT: (0, 0.0),
+}
+MAX_DELAY = 600.0
+
+# the first matching pattern wins (the messages of the whole cause chain, lower case)
+MESSAGE_RULES = [
+    (THROTTLED, re.compile(r'\b429\b|too many requests|rate.?limit|temporarily blocked')),
+    (PERMANENT, re.compile(r'\b(404|410)\b|(video|page) not found|video unavailable|this video is unavailable|has been removed|'
+                           r'no longer available|content isn.t available|private video|unsupported url|'
+                           r'not a valid url|is not a valid')),
+    (TRANSIENT, re.compile(r'timed? ?out|connection (reset|refused|aborted)|temporar|\b(5\d\d|403|408)\b|'
+                           r'incomplete ?read|network is unreachable|remote end closed|eof occurred')),
+]
+TRANSIENT_TYPES = (TimeoutError, ConnectionError, socket.timeout, http.client.IncompleteRead,
+                   youtube_dl.networking.exceptions.TransportError,
+                   youtube_dl.networking.exceptions.IncompleteRead)
+
+
+def _chain(error):
+    # the error, the errors it wraps (DownloadError.exc_info, ExtractorError.cause) and their causes
+    seen = []
+    while error is not None and error not in seen and len(seen) < 10:
+        seen.append(error)
+        exc_info = getattr(error, 'exc_info', None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        cause = getattr(error, 'cause', None)
+        error = next((e for e in (wrapped, cause if isinstance(cause, BaseException) else None,
+                                  error.__cause__, error.__context__) if e is not None and e not in seen), None)
+    return seen
+
+
+def classify(error):
+    """
+    Get the class of a download error (throttled, transient, permanent, postprocess or unknown).
+    """
+    chain = _chain(error)
+    for e in chain:
+        status = getattr(e, 'status', None) or getattr(e, 'code', None)
+        if isinstance(status, int):
+            if status == 429:
+                return THROTTLED
+            if status in (404, 410):
+                return PERMANENT
+            if status >= 500 or status in (403, 408):
+                return TRANSIENT
+    if any(isinstance(e, youtube_dl.utils.PostProcessingError) for e in chain):
+        return POSTPROCESS
+    if any(isinstance(e, TRANSIENT_TYPES) for e in chain):
+        return TRANSIENT
+    message = " | ".join(str(e) for e in chain).lower()
+    for error_class, pattern in MESSAGE_RULES:
+        if pattern.search(message):
+            return error_class
+    # yt-dlp marks the errors that are not bugs or network failures (e.g. unavailable videos) as expected
+    if any(isinstance(e, youtube_dl.utils.ExtractorError) and e.expected for e in chain):
+        return PERMANENT
+    return UNKNOWN
+
+
+def backoff(error_class, attempt, budgets=BUDGETS, max_delay=MAX_DELAY):
+    """
+    The delay before retry number `attempt` (0-based): doubling from the base delay of the class, with jitter.
+    """
+    delay = min(max_delay, budgets[error_class][1] * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry(fn, video_id, budgets=BUDGETS, max_delay=MAX_DELAY, sleep=time.sleep):
+    """
+    Call fn() and retry it according to the class of its errors.
+
+    Parameters
+    ----------
+    fn : callable
+        The download (no arguments).
+    video_id : str
+        The id of the video (for the log).
+    budgets : dict, optional
+        class -> (retries, base delay in seconds).
+    max_delay : float, optional
+        The largest delay between two attempts.
+
+    Returns
+    -------
+    The result of fn. When the budget of the class of the last error is spent, that error is raised.
+    """
+    attempts = {}
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            error_class = classify(e)
+            attempt = attempts.get(error_class, 0)
+            if attempt >= budgets.get(error_class, (0, 0))[0]:
+                raise
+            attempts[error_class] = attempt + 1
+            delay = backoff(error_class, attempt, budgets, max_delay)
+            logging.warning(f"Retrying ({error_class}, attempt {attempt + 1}) in {delay:.1f}s: {video_id} - {e}")
+            sleep(delay)
+
+
+def record_failure(video_id, error, duration=None, stage='download'):
+    """
+    Record a failed download in the manifest; permanent failures become dead letters.
+
+    Returns
+    -------
+    str
+        The class of the error.
+    """
+    error_class = classify(error)
+    manifest.failed(video_id, stage, error, duration, error_class, dead=error_class == PERMANENT)
+    return error_class
@@ -0,0 +1,114 @@
+"""
+This file runs jobs on a process pool with backpressure and real completion tracking.
+
+Compared to submitting everything to a ProcessPoolExecutor in a loop:
+* at most `max_pending` jobs are submitted at once (the rest of the arguments stay with the caller)
+* every job is reported when it completes, with its result or its exception
+* worker processes are replaced after `max_tasks_per_child` jobs, which releases the memory
+  leaked by the audio/video libraries over long runs
+* a worker that dies (e.g. killed for memory) only fails the jobs it was running; the pool
+  is recreated and the remaining jobs continue
+"""
+
+import os
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from tqdm import tqdm
+
+
+# error is None when the job succeeded
+JobResult = namedtuple('JobResult', ['args', 'result', 'error'])
+
+
+def _make_executor(max_workers, max_tasks_per_child, initializer, initargs, mp_context=None):
+    try:
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs,
+                                   mp_context=mp_context, max_tasks_per_child=max_tasks_per_child)
+    except TypeError:
+        # max_tasks_per_child needs Python 3.11
+        logging.warning("Worker recycling is not supported by this Python version")
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs,
+                                   mp_context=mp_context)
+
+
+def run_jobs(fn, jobs, max_workers=None, max_pending=None, max_tasks_per_child=None,
+             initializer=None, initargs=(), verbose=False, desc="Processing", total=None, mp_context=None):
+    """
+    Run fn(*args) for every args in jobs on a process pool and yield the results as they complete.
+
+    Parameters
+    ----------
+    fn : callable
+        A picklable (module level) function.
+    jobs : iterable of tuple
+        The arguments of each call. Consumed lazily, so it may be a generator.
+    max_workers : int, optional
+        The number of worker processes. Defaults to the number of CPUs.
+    max_pending : int, optional
+        The maximum number of submitted but unfinished jobs. Defaults to 2 * max_workers.
+    max_tasks_per_child : int, optional
+        Replace a worker process after this many jobs. None keeps the workers for the whole run.
+    initializer, initargs : optional
+        Passed to ProcessPoolExecutor (run in every new worker).
+    verbose : bool, optional
+        Show a progress bar that advances when jobs complete.
+    desc : str, optional
+        The description of the progress bar.
+    total : int, optional
+        The number of jobs for the progress bar (defaults to len(jobs) when it has one).
+    mp_context : multiprocessing context, optional
+        How the workers are started, e.g. multiprocessing.get_context('spawn') when the caller
+        runs other threads (forking a threaded process is unsafe).
+
+    Yields
+    ------
+    JobResult
+        (args, result, error) of each job, in completion order.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    if total is None and hasattr(jobs, '__len__'):
+        total = len(jobs)
+    jobs = iter(jobs)
+    progress = tqdm(total=total, desc=desc) if verbose else None
+
+    executor = _make_executor(max_workers, max_tasks_per_child, initializer, initargs, mp_context)
+    pending = {}
+    exhausted = False
+    try:
+        while pending or not exhausted:
+            # fill the window
+            while not exhausted and len(pending) < max_pending:
+                args = next(jobs, None)
+                if args is None:
+                    exhausted = True
+                    break
+                try:
+                    pending[executor.submit(fn, *args)] = args
+                except BrokenProcessPool:
+                    # the pool broke while idle; start a new one and submit again
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = _make_executor(max_workers, max_tasks_per_child, initializer, initargs, mp_context)
+                    pending[executor.submit(fn, *args)] = args
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                # a worker died: every unfinished job of this pool fails, collect them all and start over
+                logging.error("A worker process died, restarting the pool")
+                done, _ = wait(pending)
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = _make_executor(max_workers, max_tasks_per_child, initializer, initargs, mp_context)
+            for future in done:
+                args = pending.pop(future)
+                error = future.exception()
+                if progress is not None:
+                    progress.update(1)
+                yield JobResult(args, None if error else future.result(), error)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if progress is not None:
+            progress.close()
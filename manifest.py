@@ -0,0 +1,204 @@
+"""
+This file keeps the manifest of the pipeline: the state of every video in every stage (SQLite).
+
+One row per (video_id, stage), where stage is 'download' or 'transcribe', with the status
+(pending, running, done, failed, dead), the number of attempts, the bytes written, the duration of the
+last attempt, the class and message of the last error and the timestamps. The downloaders and
+transcribers update it in a transaction per event, and "what's left" is one indexed query
+instead of an os.path.isfile call per video. Dead letters (videos that failed permanently,
+e.g. removed) are not part of "what's left", so reruns do not spend time on them.
+
+Each output directory of a stage is bootstrapped once from the files already in it (one directory
+listing), so existing downloads and transcripts are not redone. The bootstrapped directories are
+recorded per stage, so profiles and output folders that share one manifest are each bootstrapped.
+
+The manifest can be shared by threads and processes (one connection per thread, WAL journal).
+"""
+
+import os
+import time
+import logging
+import shared_state
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+DEAD = 'dead'
+
+
+class Manifest(shared_state.SQLiteFile):
+    """
+    The manifest stored in a SQLite file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite file (created if missing).
+    """
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS videos (
+                                video_id TEXT NOT NULL,
+                                stage TEXT NOT NULL,
+                                status TEXT NOT NULL,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                bytes INTEGER,
+                                duration REAL,
+                                error_class TEXT,
+                                error TEXT,
+                                created REAL NOT NULL,
+                                updated REAL NOT NULL,
+                                PRIMARY KEY (video_id, stage))""")
+            conn.execute("CREATE INDEX IF NOT EXISTS videos_status ON videos (stage, status)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS bootstraps (
+                                stage TEXT NOT NULL,
+                                directory TEXT NOT NULL,
+                                suffix TEXT NOT NULL,
+                                count INTEGER NOT NULL,
+                                created REAL NOT NULL,
+                                PRIMARY KEY (stage, directory, suffix))""")
+
+    def add(self, video_ids, stage):
+        """
+        Register videos for a stage (pending); videos that are already known keep their state.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO videos (video_id, stage, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                             ((str(video_id), stage, PENDING, now, now) for video_id in video_ids))
+
+    def mark_done(self, video_ids, stage):
+        """
+        Mark videos as done whose output exists outside the pipeline (e.g. in the transcript store).
+
+        Returns
+        -------
+        int
+            The number of videos marked as done (the ones already done are left as they are).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany("""INSERT INTO videos (video_id, stage, status, created, updated) VALUES (?, ?, ?, ?, ?)
+                                ON CONFLICT (video_id, stage) DO UPDATE SET status = excluded.status,
+                                    error_class = NULL, error = NULL, updated = excluded.updated
+                                WHERE status != excluded.status""",
+                             ((str(video_id), stage, DONE, now, now) for video_id in video_ids))
+            return conn.total_changes - before
+
+    def bootstrap(self, stage, directory, suffix):
+        """
+        Mark the files in a directory (video_id + suffix) as done, once per (stage, directory, suffix).
+
+        A video that is known but not done (e.g. pending) and whose file is there is marked as done too.
+
+        Returns
+        -------
+        int
+            The number of videos marked as done.
+        """
+        directory = os.path.abspath(directory)
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM bootstraps WHERE stage = ? AND directory = ? AND suffix = ?",
+                            (stage, directory, suffix)).fetchone():
+                return 0
+        if not os.path.isdir(directory):
+            return 0
+        now = time.time()
+        rows = [(entry.name[:-len(suffix)], stage, DONE, entry.stat().st_size, now, now)
+                for entry in os.scandir(directory) if entry.name.endswith(suffix) and entry.is_file()]
+        with self._connect() as conn:
+            conn.executemany("""INSERT INTO videos (video_id, stage, status, bytes, created, updated) VALUES (?, ?, ?, ?, ?, ?)
+                                ON CONFLICT (video_id, stage) DO UPDATE SET status = excluded.status, bytes = excluded.bytes,
+                                    error_class = NULL, error = NULL, updated = excluded.updated
+                                WHERE status != excluded.status""", rows)
+            conn.execute("INSERT OR IGNORE INTO bootstraps (stage, directory, suffix, count, created) VALUES (?, ?, ?, ?, ?)",
+                         (stage, directory, suffix, len(rows), now))
+        logging.info(f"Manifest bootstrapped {len(rows)} {stage} entries from {directory}")
+        return len(rows)
+
+    def remaining(self, stage):
+        """
+        Get the ids of the videos of a stage that are not done (dead letters excluded).
+        """
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT video_id FROM videos WHERE stage = ? AND status NOT IN (?, ?)",
+                                                   (stage, DONE, DEAD))}
+
+    def done(self, stage):
+        """
+        Get the ids of the videos of a stage that are done.
+        """
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT video_id FROM videos WHERE stage = ? AND status = ?", (stage, DONE))}
+
+    def dead_letters(self, stage):
+        """
+        Get the videos of a stage that failed permanently as (video_id, error_class, error) tuples.
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT video_id, error_class, error FROM videos WHERE stage = ? AND status = ? ORDER BY video_id",
+                                (stage, DEAD)).fetchall()
+
+    def start(self, video_id, stage):
+        """
+        Record the start of an attempt.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""INSERT INTO videos (video_id, stage, status, attempts, created, updated) VALUES (?, ?, ?, 1, ?, ?)
+                            ON CONFLICT (video_id, stage) DO UPDATE SET status = excluded.status,
+                                attempts = attempts + 1, updated = excluded.updated""",
+                         (str(video_id), stage, RUNNING, now, now))
+
+    def finish(self, video_id, stage, nbytes=None, duration=None):
+        """
+        Record a successful attempt.
+        """
+        with self._connect() as conn:
+            conn.execute("""UPDATE videos SET status = ?, bytes = ?, duration = ?, error_class = NULL, error = NULL, updated = ?
+                            WHERE video_id = ? AND stage = ?""",
+                         (DONE, nbytes, duration, time.time(), str(video_id), stage))
+
+    def fail(self, video_id, stage, error, duration=None, error_class=None, dead=False):
+        """
+        Record a failed attempt (error is the exception).
+
+        error_class defaults to the exception type; dead=True moves the video to the dead letters.
+        """
+        with self._connect() as conn:
+            conn.execute("""UPDATE videos SET status = ?, duration = ?, error_class = ?, error = ?, updated = ?
+                            WHERE video_id = ? AND stage = ?""",
+                         (DEAD if dead else FAILED, duration, error_class or type(error).__name__, str(error)[:1000],
+                          time.time(), str(video_id), stage))
+
+    def summary(self, stage):
+        """
+        Get the number of videos of a stage per status.
+        """
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM videos WHERE stage = ? GROUP BY status", (stage,)).fetchall())
+
+
+# process-wide manifest: configure(path) enables it (path=None disables it), get_manifest() returns it or None
+_MANIFEST = shared_state.ProcessGlobal(lambda path=None: Manifest(path) if path else None)
+configure = _MANIFEST.configure
+get_manifest = _MANIFEST.get
+
+
+# shortcuts for the scripts: no-ops when the manifest is disabled
+def started(video_id, stage):
+    if get_manifest() is not None:
+        get_manifest().start(video_id, stage)
+
+
+def finished(video_id, stage, nbytes=None, duration=None):
+    if get_manifest() is not None:
+        get_manifest().finish(video_id, stage, nbytes, duration)
+
+
+def failed(video_id, stage, error, duration=None, error_class=None, dead=False):
+    if get_manifest() is not None:
+        get_manifest().fail(video_id, stage, error, duration, error_class, dead)
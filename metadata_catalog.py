@@ -0,0 +1,224 @@
+"""
+This file harvests the metadata of the videos (duration, resolution, upload date, ...) into a local catalog (SQLite).
+
+One row per video_id with the fields of the yt-dlp info dict that the analysis uses, the
+languages of the subtitles and automatic captions, and the time it was fetched. The later stages
+read the catalog (e.g. metadata_catalog.load_catalog(path, columns=['video_id', 'duration']))
+instead of querying the extractors again, and the subtitle fetcher records the info dicts it
+extracts anyway. A rerun only fetches the videos that are missing, failed before or older
+than --max-age days.
+
+The catalog can be shared by threads and processes (one connection per thread, WAL journal).
+
+Usage: python metadata_catalog.py -p sponsors --catalog metadata.db -c 8 --max-age 30
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import pandas as pd
+from functools import partial
+import ydl_session
+import download_retry
+import video_download
+from download_orchestrator import run_downloads
+import shared_state
+
+PATH = os.path.dirname(__file__)
+
+# catalog column -> info dict field
+FIELDS = {
+    'title': 'title',
+    'description': 'description',
+    'uploader': 'uploader',
+    'uploader_id': 'uploader_id',
+    'channel_id': 'channel_id',
+    'duration': 'duration',
+    'width': 'width',
+    'height': 'height',
+    'fps': 'fps',
+    'upload_date': 'upload_date',
+    'timestamp': 'timestamp',
+    'view_count': 'view_count',
+    'like_count': 'like_count',
+    'comment_count': 'comment_count',
+    'extractor': 'extractor_key',
+    'webpage_url': 'webpage_url',
+}
+COLUMNS = (['video_id'] + list(FIELDS) +
+           ['subtitles', 'automatic_captions', 'fetched', 'error'])
+
+METADATA_OPTS = {
+    'skip_download': True,
+    'ignore_no_formats_error': True,    # the metadata is still there when no format is downloadable
+    'noplaylist': True,
+}
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Harvest the metadata of the videos of a profile into the catalog')
+    parser.add_argument('-p', '--profile', help='The crawl', choices=list(video_download.PROFILES), required=True)
+    parser.add_argument('--csv', help='The CSV file of the videos (video_id, video_url); defaults to the profile CSV', default=None)
+    parser.add_argument('--catalog', help='The path to the catalog (SQLite file)', default=os.path.join(PATH, 'metadata.db'))
+    parser.add_argument('--max-age', help='Fetch the metadata again after this many days (0 = never)', type=float, default=0)
+    parser.add_argument('-c', '--concurrency', help='The number of extractions at once', type=int, default=8)
+    parser.add_argument('--rate', help='The extractions started per second per host (0 = unlimited)', type=float, default=1.0)
+    parser.add_argument('-v', '--verbose', help='Print the log messages', action='store_true')
+    return parser.parse_args()
+
+
+def info_row(info):
+    """
+    Get the catalog columns (without video_id, fetched and error) of a yt-dlp info dict.
+    """
+    row = {column: info.get(field) for column, field in FIELDS.items()}
+    # the resolution of the selected format when the video itself has none
+    for key in ('width', 'height', 'fps'):
+        if row[key] is None:
+            row[key] = next((f.get(key) for f in info.get('requested_formats') or [] if f.get(key)), None)
+    row['subtitles'] = json.dumps(sorted(info.get('subtitles') or {}))
+    row['automatic_captions'] = json.dumps(sorted(info.get('automatic_captions') or {}))
+    return row
+
+
+class MetadataCatalog(shared_state.SQLiteFile):
+    """
+    The metadata catalog stored in a SQLite file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite file (created if missing).
+    """
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS metadata (
+                                video_id TEXT PRIMARY KEY,
+                                title TEXT, description TEXT, uploader TEXT, uploader_id TEXT, channel_id TEXT,
+                                duration REAL, width INTEGER, height INTEGER, fps REAL,
+                                upload_date TEXT, timestamp INTEGER,
+                                view_count INTEGER, like_count INTEGER, comment_count INTEGER,
+                                extractor TEXT, webpage_url TEXT,
+                                subtitles TEXT, automatic_captions TEXT,
+                                fetched REAL NOT NULL,
+                                error TEXT)""")
+
+    def put(self, video_id, info):
+        """
+        Store (or replace) the metadata of a video from its info dict.
+        """
+        row = dict(info_row(info), video_id=str(video_id), fetched=time.time(), error=None)
+        with self._connect() as conn:
+            conn.execute(f"INSERT OR REPLACE INTO metadata ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                         [row[column] for column in COLUMNS])
+
+    def put_error(self, video_id, error):
+        """
+        Record a failed extraction; the metadata of an earlier extraction is kept.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""INSERT INTO metadata (video_id, fetched, error) VALUES (?, ?, ?)
+                            ON CONFLICT (video_id) DO UPDATE SET error = excluded.error, fetched = excluded.fetched""",
+                         (str(video_id), now, str(error)[:1000]))
+
+    def missing(self, video_ids, max_age=None):
+        """
+        Get the ids that have no metadata, failed, or were fetched more than max_age seconds ago.
+        """
+        with self._connect() as conn:
+            query = "SELECT video_id FROM metadata WHERE error IS NULL"
+            params = ()
+            if max_age:
+                query += " AND fetched >= ?"
+                params = (time.time() - max_age,)
+            fresh = {row[0] for row in conn.execute(query, params)}
+        return [str(video_id) for video_id in video_ids if str(video_id) not in fresh]
+
+    def get(self, video_id):
+        """
+        Get the metadata of a video as a dict, or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM metadata WHERE video_id = ?", (str(video_id),)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def to_frame(self, columns=None, video_ids=None):
+        """
+        Get the catalog as a DataFrame, only the given columns (video_id is always included).
+        """
+        columns = ['video_id'] + [c for c in (columns or COLUMNS) if c != 'video_id' and c in COLUMNS]
+        with self._connect() as conn:
+            data = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM metadata", conn)
+        if video_ids is not None:
+            data = data[data.video_id.isin({str(video_id) for video_id in video_ids})]
+        return data
+
+
+# process-wide catalog: configure(path) enables it (path=None disables it), get_catalog() returns it or None
+_CATALOG = shared_state.ProcessGlobal(lambda path=None: MetadataCatalog(path) if path else None)
+configure = _CATALOG.configure
+get_catalog = _CATALOG.get
+
+
+def record(video_id, info):
+    """
+    Store an info dict that was extracted anyway (no-op when the catalog is disabled).
+    """
+    if get_catalog() is not None:
+        get_catalog().put(video_id, info)
+
+
+def load_catalog(path, columns=None, video_ids=None):
+    """
+    Read the catalog (only the given columns) without extracting anything.
+    """
+    return MetadataCatalog(path).to_frame(columns, video_ids)
+
+
+def harvest_metadata(url, video_id, catalog, verbose=False):
+    """
+    Extract the metadata of a video (no download) and store it in the catalog.
+
+    Returns
+    -------
+    bool
+        True if the metadata was stored.
+    """
+    session = ydl_session.get_session(METADATA_OPTS)
+    try:
+        info = download_retry.retry(lambda: session.extract_info(url), video_id)
+        catalog.put(video_id, info)
+        if verbose: print(f"Metadata: {video_id} - {info.get('duration')}s, {info.get('width')}x{info.get('height')}")
+        return True
+    except Exception as e:
+        # DownloadError, ExtractorError, ...
+        logging.error(f"Metadata error: {video_id} - {type(e).__name__}: {e}")
+        catalog.put_error(video_id, e)
+        if verbose: print(f"Metadata error: {e}")
+        return False
+
+
+def main():
+    args = get_args()
+    logging.basicConfig(filename=os.path.join(PATH, 'metadata_catalog.log'), level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    catalog = MetadataCatalog(args.catalog)
+    data = video_download.video_data(args.profile, args.csv)
+    # only the missing, failed and stale videos
+    missing = set(catalog.missing(data.video_id, args.max_age * 86400))
+    jobs = [(r[1], str(r[0])) for r in data.to_numpy() if str(r[0]) in missing]   # (url, video_id)
+    print(f"Number of videos: {len(data)}, to fetch: {len(jobs)}")
+    results, stats = run_downloads(partial(harvest_metadata, catalog=catalog, verbose=args.verbose),
+                                   jobs, args.concurrency, args.rate or None)
+    print(f"Completed: {stats.completed}, Failed: {stats.failed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+This file downloads and transcribes the videos of a profile in one overlapped pipeline.
+
+Instead of downloading everything, writing files.txt and transcribing in a second pass, every
+completed download is put on a bounded queue and picked up right away by the transcription
+worker processes:
+* the downloads run as in video_download.py (asyncio orchestrator, per-host rate limit, retries)
+* the transcription runs as in transcribe_parallel.py (process pool, journal, cache, limits)
+* backpressure: when transcription falls behind, the queue fills up and the download threads
+  wait on it, so no more than queue-size + workers downloaded videos wait for transcription
+Videos that were downloaded before but not transcribed (manifest) are queued first.
+With --audio-only only the audio is downloaded (.m4a), which the transcription reads directly.
+With --disk-quota the downloads pause while the video folder is near the quota, and every video
+is evicted (deleted or compacted) as soon as its transcript is written (see disk_budget.py).
+
+Usage: python pipeline.py -p creators -o transcripts -c 16 -w 4 --queue-size 8 --vad
+"""
+
+import os
+import queue
+import logging
+import argparse
+import threading
+import multiprocessing
+import manifest
+import transcript_store
+import disk_budget
+import recognizers
+import chunk_recognition
+import job_scheduler
+import video_download
+import transcribe_parallel
+from download_orchestrator import run_downloads
+
+PATH = os.path.dirname(__file__)
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Download and transcribe the videos of a profile')
+    parser.add_argument('-p', '--profile', help='The crawl to download', choices=list(video_download.PROFILES), required=True)
+    parser.add_argument('--csv', help='The CSV file of the videos (video_id, video_url); defaults to the profile CSV', default=None)
+    parser.add_argument('--videos', help='The folder of the downloaded videos; defaults to the profile folder', default=None)
+    parser.add_argument('-o', '--output', help='The output path to store the transcripts', required=True)
+    parser.add_argument('--shard', help='Only process shard i of N (e.g. 0/4), by a stable hash of video_id', default='0/1')
+    parser.add_argument('--reverse', help='Start from the end of the list', action='store_true')
+    parser.add_argument('-v', '--verbose', help='Print the log messages', action='store_true')
+    parser.add_argument('--manifest', help='The path to the manifest database (SQLite file)', default=os.path.join(PATH, 'manifest.db'))
+    parser.add_argument('--queue-size', help='The number of downloaded videos that may wait for transcription', type=int, default=8)
+    # download stage
+    parser.add_argument('-c', '--concurrency', help='The number of downloads at once', type=int, default=16)
+    parser.add_argument('--download-rate', help='The downloads started per second per host (0 = unlimited)', type=float, default=2.0)
+    parser.add_argument('--jitter', help='The maximum random delay before each download in seconds', type=float, default=0.5)
+    parser.add_argument('--audio-only', help='Download only the audio (smallest usable stream, stored as .m4a)', action='store_true')
+    parser.add_argument('--disk-quota', help='The disk quota of the video folder in GB (0 = unlimited)', type=float, default=0)
+    parser.add_argument('--evict', help='Delete the transcribed videos or compact them to opus', choices=disk_budget.MODES, default='delete')
+    # transcription stage
+    parser.add_argument('-w', '--workers', help='Number of transcription processes (default: number of CPUs)', type=int, default=None)
+    parser.add_argument('--max-tasks-per-child', help='Replace a worker process after this many videos (0 = never)', type=int, default=50)
+    parser.add_argument('-b', '--backend', help='The speech recognition backend', choices=list(recognizers.BACKENDS), default='google')
+    parser.add_argument('--backend-option', help='An option of the backend as KEY=VALUE (e.g. model_path=models/vosk-en, latency=0.5)', action='append', default=[])
+    parser.add_argument('--cache', help='The path to the chunk transcript cache (SQLite file); disabled if not given', default=None)
+    parser.add_argument('--cache-size', help='The maximum size of the cached transcripts in MB', type=int, default=1024)
+    parser.add_argument('--store', help='The path to the transcript store (SQLite file); transcripts are .txt files if not given', default=None)
+    parser.add_argument('--sample-rate', help='The sample rate the audio is converted to before chunking', type=int, default=16000)
+    parser.add_argument('--sample-width', help='The sample width (bytes) the audio is converted to before chunking', type=int, choices=[2, 4], default=2)
+    parser.add_argument('--vad', help='Only recognize speech (skip silence and music) with the VAD chunker', action='store_true')
+    parser.add_argument('--chunk-workers', help='Number of chunks recognized at once per video (1 = sequential)', type=int, default=1)
+    parser.add_argument('--max-in-flight', help='Maximum number of chunks being recognized at once across all processes', type=int, default=None)
+    parser.add_argument('--recognition-rate', help='Maximum number of recognition requests per second across all processes', type=float, default=None)
+    return parser.parse_args()
+
+
+def download_stage(videos, backlog, video_queue, concurrency=16, rate=2.0, jitter=0.5, verbose=False, audio_only=False):
+    """
+    Put the backlog and then every downloaded video on the queue; None marks the end.
+    """
+    def download_and_enqueue(url, video_id, output_path):
+        ok = video_download.download_video(url, video_id, output_path, verbose, audio_only=audio_only)
+        if ok:
+            # blocks while the queue is full (the transcription is behind)
+            video_queue.put(output_path)
+        return ok
+
+    try:
+        for video_file in backlog:
+            video_queue.put(video_file)
+        run_downloads(download_and_enqueue, videos, concurrency, rate or None, jitter=jitter)
+    except Exception as e:
+        logging.error(f"Download stage failed: {type(e).__name__}: {e}")
+    finally:
+        video_queue.put(None)
+
+
+def main():
+    args = get_args()
+    logging.basicConfig(filename=os.path.join(PATH, 'pipeline.log'), level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+    video_path = args.videos or video_download.PROFILES[args.profile]['output']
+    os.makedirs(video_path, exist_ok=True)
+    os.makedirs(args.output, exist_ok=True)
+
+    # Step 1: select the work of the shard (manifest)
+    tracker = manifest.configure(args.manifest)
+    disk_budget.configure([video_path], int(args.disk_quota * 1024 ** 3), mode=args.evict)
+    data = video_download.shard_videos(video_download.video_data(args.profile, args.csv), video_download.parse_shard(args.shard))
+    ext = video_download.AUDIO_EXT if args.audio_only else video_download.VIDEO_EXT
+    videos = video_download.select_videos(data, video_path, reverse=args.reverse, ext=ext)
+    if args.store:
+        # the transcripts are in the store, not .txt files in the output path
+        tracker.mark_done(transcript_store.TranscriptStore(args.store).ids(), 'transcribe')
+    else:
+        tracker.bootstrap('transcribe', args.output, '.txt')
+    tracker.add(data.video_id, 'transcribe')
+    remaining = tracker.remaining('transcribe')
+    downloading = {str(video[1]) for video in videos}
+    # downloaded before, not transcribed yet
+    backlog = [video_download.find_media(video_path, video_id) for video_id in data.video_id.astype(str)
+               if video_id in remaining and video_id not in downloading]
+    backlog = [video_file for video_file in backlog if video_file is not None]
+    print(f"Videos to download: {len(videos)}, downloaded videos to transcribe: {len(backlog)}")
+
+    # Step 2: download in a background thread, feeding the bounded queue
+    video_queue = queue.Queue(maxsize=args.queue_size)
+    downloader = threading.Thread(target=download_stage, daemon=True,
+                                  args=(videos, backlog, video_queue, args.concurrency, args.download_rate,
+                                        args.jitter, args.verbose, args.audio_only))
+    downloader.start()
+
+    # Step 3: transcribe the videos as they come off the queue
+    workers = args.workers or os.cpu_count() or 1
+    limiter, in_flight = chunk_recognition.make_limits(args.max_in_flight, args.recognition_rate)
+    initargs = (limiter, in_flight, args.backend, recognizers.parse_options(args.backend_option),
+                args.cache, args.cache_size, args.manifest, args.store)
+    jobs = ((video_file, args.output, args.verbose, args.chunk_workers, args.vad, args.sample_rate, args.sample_width)
+            for video_file in iter(video_queue.get, None))
+    completed, failures = 0, 0
+    # the workers are spawned, not forked: the download threads are running
+    for job in job_scheduler.run_jobs(transcribe_parallel.process_video, jobs, max_workers=workers, max_pending=workers,
+                                      max_tasks_per_child=args.max_tasks_per_child or None,
+                                      initializer=transcribe_parallel.init_worker, initargs=initargs,
+                                      mp_context=multiprocessing.get_context('spawn')):
+        if job.error is None:
+            completed += 1
+            # the transcript is written: the video is no longer needed
+            disk_budget.transcribed(job.args[0])
+        else:
+            failures += 1
+            logging.error(f"Transcription failed: {job.args[0]} - {type(job.error).__name__}: {job.error}")
+    downloader.join()
+    logging.info(f"Pipeline finished: {completed} transcribed, {failures} failed")
+    print(f"Transcribed: {completed}, Failed: {failures}")
+    print(f"Downloads: {tracker.summary('download')}")
+
+
+if __name__ == '__main__':
+    main()
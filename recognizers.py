@@ -0,0 +1,248 @@
+"""
+This file defines the speech recognition backends used to transcribe audio chunks.
+
+Every backend takes PCM chunks (raw samples plus their format) and returns the transcript,
+so the transcription scripts do not depend on one remote API:
+* google: Google Speech Recognition (remote, the original behavior)
+* vosk: Vosk/Kaldi (offline, CPU only; needs `pip install vosk` and a model)
+* stub: deterministic fake transcripts with a configurable latency (offline, for load testing)
+
+Backends raise speech_recognition.UnknownValueError when a chunk has no recognizable speech
+and speech_recognition.RequestError when the recognition itself failed.
+"""
+
+import json
+import time
+import hashlib
+import threading
+import speech_recognition as sr
+from audio_normalize import PCMChunk, normalize_pcm
+
+
+def pcm_chunk(segment):
+    """
+    Get the PCM chunk of a pydub AudioSegment. The samples are a view of the segment's buffer (no copy).
+    """
+    return PCMChunk(memoryview(segment.raw_data), segment.frame_rate, segment.sample_width, segment.channels)
+
+
+def to_mono(chunk, sample_width=2):
+    """
+    Downmix a PCM chunk to mono with the given sample width (the sample rate is kept).
+    """
+    return normalize_pcm(chunk, sample_width=sample_width)
+
+
+def audio_data(chunk):
+    """
+    Build the speech_recognition AudioData of a PCMChunk directly from its sample buffer.
+
+    Mono chunks are passed through without a copy; there is no WAV export and re-parse.
+    """
+    if chunk.channels != 1:
+        chunk = to_mono(chunk, chunk.sample_width)
+    return sr.AudioData(chunk.data, chunk.frame_rate, chunk.sample_width)
+
+
+class Recognizer:
+    """
+    Base class of the recognition backends.
+
+    Subclasses implement recognize(); recognize_batch() can be overridden by engines that are
+    faster on several chunks at once (with batch_size set to the chunks they take per call).
+    chunk_recognition.recognize_chunks passes the chunks of a video to recognize_batch().
+    """
+    name = None
+    batch_size = 1
+
+    @property
+    def identity(self):
+        """
+        A string that identifies the backend and the settings that change its output.
+        """
+        return self.name
+
+    def recognize(self, chunk):
+        """
+        Transcribe one PCMChunk.
+        """
+        raise NotImplementedError
+
+    def recognize_batch(self, chunks):
+        """
+        Transcribe a list of PCMChunks.
+
+        Returns
+        -------
+        list
+            The transcript of each chunk, or the exception that failed it (e.g. sr.UnknownValueError).
+        """
+        transcripts = []
+        for chunk in chunks:
+            try:
+                transcripts.append(self.recognize(chunk))
+            except Exception as e:
+                transcripts.append(e)
+        return transcripts
+
+
+class GoogleRecognizer(Recognizer):
+    """
+    Google Speech Recognition (the free web API used by speech_recognition).
+
+    Parameters
+    ----------
+    language : str, optional
+        The recognition language, e.g. 'en-US'.
+    """
+    name = 'google'
+
+    def __init__(self, language='en-US'):
+        self.language = language
+
+    @property
+    def identity(self):
+        return f"{self.name}:{self.language}"
+
+    def recognize(self, chunk):
+        recognizer = sr.Recognizer()
+        return recognizer.recognize_google(audio_data(chunk), language=self.language)
+
+
+class VoskRecognizer(Recognizer):
+    """
+    Vosk (Kaldi) offline recognizer, CPU only.
+
+    Parameters
+    ----------
+    model_path : str, optional
+        The path to an unpacked Vosk model. If not given, the small English model
+        is downloaded by vosk on first use.
+    """
+    name = 'vosk'
+    _models = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path
+
+    @property
+    def identity(self):
+        return f"{self.name}:{self.model_path or 'en-us'}"
+
+    def _model(self):
+        # loading a model takes seconds and hundreds of MB, so it is shared by all threads of a process
+        with self._lock:
+            if self.model_path not in self._models:
+                try:
+                    import vosk
+                except ImportError:
+                    raise sr.RequestError("missing vosk module: ensure that vosk is set up correctly.")
+                vosk.SetLogLevel(-1)
+                self._models[self.model_path] = vosk.Model(self.model_path) if self.model_path else vosk.Model(lang='en-us')
+            return self._models[self.model_path]
+
+    def recognize(self, chunk):
+        # the model first: a missing vosk raises sr.RequestError there
+        model = self._model()
+        from vosk import KaldiRecognizer
+        chunk = to_mono(chunk, 2)
+        recognizer = KaldiRecognizer(model, chunk.frame_rate)
+        recognizer.AcceptWaveform(bytes(chunk.data))
+        transcript = json.loads(recognizer.FinalResult()).get('text', '')
+        if not transcript:
+            raise sr.UnknownValueError()
+        return transcript
+
+
+class StubRecognizer(Recognizer):
+    """
+    Deterministic fake recognizer for load testing the pipeline without a network.
+
+    The transcript only depends on the samples of the chunk, so repeated runs give identical output.
+
+    Parameters
+    ----------
+    latency : float, optional
+        Seconds to sleep per chunk to simulate a remote service.
+    words_per_second : float, optional
+        The number of fake words produced per second of audio.
+    """
+    name = 'stub'
+
+    def __init__(self, latency=0.0, words_per_second=2.5):
+        self.latency = float(latency)
+        self.words_per_second = float(words_per_second)
+
+    @property
+    def identity(self):
+        return f"{self.name}:{self.words_per_second}"
+
+    def recognize(self, chunk):
+        if self.latency:
+            time.sleep(self.latency)
+        frame_width = chunk.sample_width * chunk.channels
+        seconds = len(chunk.data) / (frame_width * chunk.frame_rate)
+        if not any(chunk.data):
+            raise sr.UnknownValueError()  # digital silence
+        digest = hashlib.sha1(chunk.data).hexdigest()
+        return " ".join(f"w{digest[i % 32:i % 32 + 8]}" for i in range(int(seconds * self.words_per_second)))
+
+
+BACKENDS = {
+    'google': GoogleRecognizer,
+    'vosk': VoskRecognizer,
+    'stub': StubRecognizer,
+}
+
+_instances = {}
+_default = ('google', {})
+
+
+def get_backend(name='google', **kwargs):
+    """
+    Get the recognizer backend by name. Instances are cached per process.
+
+    Parameters
+    ----------
+    name : str
+        One of BACKENDS.
+    kwargs
+        The options of the backend (e.g. model_path for vosk, latency for stub).
+    """
+    key = (name, tuple(sorted(kwargs.items())))
+    if key not in _instances:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown recognizer backend: {name} (choose from {', '.join(BACKENDS)})")
+        _instances[key] = BACKENDS[name](**kwargs)
+    return _instances[key]
+
+
+def configure(name='google', **kwargs):
+    """
+    Set the default backend of this process (e.g. from a ProcessPoolExecutor initializer).
+    """
+    global _default
+    get_backend(name, **kwargs)  # fail early on an unknown backend
+    _default = (name, kwargs)
+
+
+def default_backend():
+    """
+    Get the default backend of this process (set by configure()).
+    """
+    name, kwargs = _default
+    return get_backend(name, **kwargs)
+
+
+def parse_options(options):
+    """
+    Parse backend options given on the command line as KEY=VALUE strings.
+    """
+    parsed = {}
+    for option in options or []:
+        key, sep, value = option.partition('=')
+        if not sep:
+            raise ValueError(f"Backend options must be KEY=VALUE: {option}")
+        parsed[key.strip().replace('-', '_')] = value.strip()
+    return parsed
@@ -0,0 +1,64 @@
+"""
+This file holds the helpers of the state that is shared by the threads and processes of the pipeline.
+
+* SQLiteFile: the base of the stores kept in a SQLite file (manifest, transcript cache, metadata
+  catalog, transcript store): one connection per thread and per process, WAL journal
+* ProcessGlobal: the process-wide instance of a store or budget, set by configure() (e.g. from a
+  ProcessPoolExecutor initializer) and read by the get_*() functions; None when it is disabled
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class SQLiteFile:
+    """
+    A SQLite file that can be shared by threads and processes.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite file (created if missing).
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        # one connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+class ProcessGlobal:
+    """
+    The process-wide instance of a store, or None when it is disabled.
+
+    Parameters
+    ----------
+    factory : callable
+        Builds the instance from the arguments of configure(), or returns None to disable it.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self.instance = None
+
+    def configure(self, *args, **kwargs):
+        """
+        Set the instance of this process from the arguments of the factory, and return it.
+        """
+        self.instance = self.factory(*args, **kwargs)
+        return self.instance
+
+    def get(self):
+        """
+        Get the instance of this process, or None when it is disabled.
+        """
+        return self.instance
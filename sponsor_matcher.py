@@ -0,0 +1,198 @@
+"""
+This file finds the sponsor mentions in the transcripts with one multi-pattern automaton (Aho-Corasick).
+
+All the patterns are compiled once:
+* the full sponsor names (matched anywhere in the text, as `name in text`)
+* the terms of the names that are not stopwords (matched as whole words)
+* the sponsorship disclosures: phrases such as "brought to you by" and words such as "sponsored"
+Each transcript is normalized once (lower case, single spaces) and scanned once, and every hit
+is returned with its offsets in the normalized text. A row then only looks up the hits of its
+own sponsor, instead of lowering and splitting the transcript again for every term.
+
+The C automaton of pyahocorasick is used when it is installed, else a pure Python one.
+
+Usage: matcher = SponsorMatcher(data.sponsor_name.unique())
+       data[['is_in_text', 'found_terms', 'sponsored_by']] = matcher.match_frame(data)
+"""
+
+import re
+from collections import namedtuple
+import pandas as pd
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+STOPWORDS = frozenset(['the', 'a', 'an', 'of', 'and', 'or', 'in', 'on', 'at', 'to', 'for', 'with', 'by', 'from', 'as', 'is'])
+# sponsorship disclosures: phrases match anywhere, words as whole words
+SPONSORED_PHRASES = ('brought to you by',)
+SPONSORED_WORDS = ('sponsored',)
+
+# pattern kinds
+NAME = 'name'
+TERM = 'term'
+DISCLOSURE = 'disclosure'
+
+# a match of a pattern in the normalized text: text[start:end] == pattern
+Hit = namedtuple('Hit', ['start', 'end', 'kind', 'pattern'])
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    """
+    Lower case with single spaces (the offsets of the hits refer to this text).
+    """
+    return _SPACES.sub(' ', text.lower()).strip()
+
+
+class _Automaton:
+    # pure Python Aho-Corasick: goto transitions, failure links and the patterns ending at each state
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.out[state].append(index)
+        # breadth first: the failure link of a state is the longest proper suffix that is a state
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                if state:
+                    fallback = self.fail[state]
+                    while fallback and char not in self.goto[fallback]:
+                        fallback = self.fail[fallback]
+                    self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def iter(self, text):
+        # (end index, pattern index) of every match, like pyahocorasick
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                yield end, index
+
+
+class SponsorMatcher:
+    """
+    The sponsor names, their terms and the sponsorship disclosures compiled into one automaton.
+
+    Parameters
+    ----------
+    sponsors : iterable
+        The sponsor names.
+    phrases : iterable, optional
+        Disclosure phrases, matched anywhere.
+    words : iterable, optional
+        Disclosure words, matched as whole words.
+    stopwords : set, optional
+        The terms of the names that are not matched on their own.
+    """
+    def __init__(self, sponsors, phrases=SPONSORED_PHRASES, words=SPONSORED_WORDS, stopwords=STOPWORDS):
+        self.stopwords = stopwords
+        self.patterns = []      # the distinct pattern strings
+        self.kinds = []         # pattern index -> set of kinds
+        index = {}
+
+        def add(pattern, kind):
+            if pattern not in index:
+                index[pattern] = len(self.patterns)
+                self.patterns.append(pattern)
+                self.kinds.append(set())
+            self.kinds[index[pattern]].add(kind)
+
+        for sponsor in sponsors:
+            terms = str(sponsor).split()
+            if terms:
+                add(normalize(' '.join(terms)), NAME)
+            for term in terms:
+                if term.lower() not in stopwords:
+                    add(term.lower(), TERM)
+        for phrase in phrases:
+            add(normalize(phrase), DISCLOSURE)
+        self.disclosure_words = {normalize(word) for word in words}
+        for word in self.disclosure_words:
+            add(word, TERM)
+        self._automaton = self._build()
+
+    def _build(self):
+        if ahocorasick is None:
+            return _Automaton(self.patterns)
+        automaton = ahocorasick.Automaton()
+        for index, pattern in enumerate(self.patterns):
+            automaton.add_word(pattern, index)
+        automaton.make_automaton()
+        return automaton
+
+    def scan(self, text, normalized=False):
+        """
+        Find every pattern in a transcript in one pass.
+
+        Returns
+        -------
+        list
+            The Hits in the normalized text; terms only where they are whole words.
+        """
+        if not normalized:
+            text = normalize(text)
+        hits = []
+        for end, index in self._automaton.iter(text):
+            pattern = self.patterns[index]
+            start, end = end - len(pattern) + 1, end + 1
+            word = (start == 0 or text[start - 1] == ' ') and (end == len(text) or text[end] == ' ')
+            for kind in self.kinds[index]:
+                if kind != TERM or word:
+                    hits.append(Hit(start, end, kind, pattern))
+        return hits
+
+    def match(self, sponsor, text):
+        """
+        Whether a sponsor is mentioned in a transcript.
+
+        Returns
+        -------
+        (is_in_text, found_terms, sponsored_by, hits)
+            found_terms are all the terms of the name if the full name is found, else the terms found as
+            words; sponsored_by is True for a disclosure; hits are the Hits of this sponsor and the disclosures.
+        """
+        return self._match(str(sponsor).split(), self.scan(text))
+
+    def _match(self, terms, hits):
+        name = normalize(' '.join(terms))
+        lowered = {term.lower() for term in terms if term.lower() not in self.stopwords}
+        found = {hit.pattern for hit in hits if hit.kind == TERM}
+        if terms and any(hit.kind == NAME and hit.pattern == name for hit in hits):
+            found_terms = terms
+        else:
+            found_terms = [term for term in terms if term.lower() in lowered and term.lower() in found]
+        sponsored_by = any(hit.kind == DISCLOSURE for hit in hits) or bool(found & self.disclosure_words)
+        own = [hit for hit in hits if hit.kind == DISCLOSURE or hit.pattern in self.disclosure_words
+               or (hit.kind == NAME and hit.pattern == name) or (hit.kind == TERM and hit.pattern in lowered)]
+        return bool(found_terms), found_terms, sponsored_by, own
+
+    def match_frame(self, data, sponsor_column='sponsor_name', text_column='transcript'):
+        """
+        Match every row of a DataFrame (one scan per transcript).
+
+        Returns
+        -------
+        pandas.DataFrame
+            is_in_text, found_terms, sponsored_by and hits columns, with the index of data.
+        """
+        rows = [self._match(str(sponsor).split(), self.scan(text))
+                for sponsor, text in zip(data[sponsor_column], data[text_column])]
+        return pd.DataFrame(rows, columns=['is_in_text', 'found_terms', 'sponsored_by', 'hits'], index=data.index)
@@ -0,0 +1,83 @@
+"""
+This file measures how long each stage of the transcription of one video takes.
+
+Stages can be timed as a block (context manager) or as a stream (the time spent producing each
+item of a generator, e.g. the extracted audio chunks). Nested stages are accounted exclusively:
+the time a stream spends producing an item is not counted again in the stage that consumes it.
+The number of bytes that flows through a stream is recorded too, so the memory and network
+effect of a stage (e.g. fewer PCM bytes after normalization or VAD) is visible in the report.
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+
+
+class StageTimings:
+    """
+    The timings of the stages of one video.
+
+    Parameters
+    ----------
+    name : str
+        The name used in the report (e.g. the video id).
+    """
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}   # stage -> [seconds, bytes, items]
+        self._stack = []
+
+    def _add(self, stage, seconds, nbytes=0, items=0):
+        totals = self.stages.setdefault(stage, [0.0, 0, 0])
+        totals[0] += seconds
+        totals[1] += nbytes
+        totals[2] += items
+        if self._stack:
+            # exclusive accounting: the enclosing stage did not do this work
+            self.stages.setdefault(self._stack[-1], [0.0, 0, 0])[0] -= seconds
+
+    @contextmanager
+    def stage(self, stage):
+        """
+        Time a block of code.
+        """
+        self._stack.append(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            self._add(stage, time.perf_counter() - start)
+
+    def timed(self, chunks, stage):
+        """
+        Time the production of each item of an iterable of AudioSegments (or bytes-like items).
+        """
+        chunks = iter(chunks)
+        while True:
+            self._stack.append(stage)
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks, None)
+            finally:
+                self._stack.pop()
+            elapsed = time.perf_counter() - start
+            if chunk is None:
+                self._add(stage, elapsed)
+                return
+            self._add(stage, elapsed, len(getattr(chunk, 'raw_data', chunk)), 1)
+            yield chunk
+
+    def report(self):
+        """
+        Log the timings (and return the report line).
+        """
+        parts = []
+        for stage, (seconds, nbytes, items) in self.stages.items():
+            part = f"{stage} {seconds:.2f}s"
+            if items:
+                part += f" ({nbytes / 1024 ** 2:.1f} MB in {items} chunks)"
+            parts.append(part)
+        line = f"Stage timings: {self.name} - " + ", ".join(parts)
+        logging.info(line)
+        return line
@@ -8,10 +8,12 @@ Creator: Shahryar Doosti (doosti@chapman.edu)
 """
 
 import os
-from moviepy.editor import VideoFileClip
-import speech_recognition as sr
-from pydub import AudioSegment
-import io
+from pydub.exceptions import CouldntDecodeError
+import recognizers
+import chunk_journal
+import manifest
+import transcript_store
+import transcription
 import numpy as np
 import logging
 import argparse
@@ -28,6 +30,15 @@ def get_args():
     parser.add_argument('-f', '--file', help='The path to a txt file including video files', required=True)
     parser.add_argument('-o', '--output', help='The output path to store the transcripts', required=True)
     parser.add_argument('-v', '--verbose', help='Print the log messages', action='store_true')
+    parser.add_argument('-b', '--backend', help='The speech recognition backend', choices=list(recognizers.BACKENDS), default='google')
+    parser.add_argument('--backend-option', help='An option of the backend as KEY=VALUE (e.g. model_path=models/vosk-en, latency=0.5)', action='append', default=[])
+    parser.add_argument('--cache', help='The path to the chunk transcript cache (SQLite file); disabled if not given', default=None)
+    parser.add_argument('--cache-size', help='The maximum size of the cached transcripts in MB', type=int, default=1024)
+    parser.add_argument('--sample-rate', help='The sample rate the audio is converted to before chunking', type=int, default=16000)
+    parser.add_argument('--sample-width', help='The sample width (bytes) the audio is converted to before chunking', type=int, choices=[2, 4], default=2)
+    parser.add_argument('--vad', help='Only recognize speech (skip silence and music) with the VAD chunker', action='store_true')
+    parser.add_argument('--manifest', help='The path to the manifest database (SQLite file)', default=os.path.join(PATH, 'manifest.db'))
+    parser.add_argument('--store', help='The path to the transcript store (SQLite file); transcripts are .txt files if not given', default=None)
     return parser.parse_args()
 
 # configure logging
@@ -45,82 +56,31 @@ def split_audio(audio, chunk_length_ms):
     return chunks
 
 # Step 3: Transcribe audio chunks (with parallelization)
-def transcribe_chunk(chunk, index, video_id):
-    recognizer = sr.Recognizer()
-    chunk_io = io.BytesIO()
-    chunk.export(chunk_io, format="wav")
-    chunk_io.seek(0)
-
-    with sr.AudioFile(chunk_io) as source:
-        audio_data = recognizer.record(source)
-        try:
-            transcript = recognizer.recognize_google(audio_data)
-            return (index, transcript)
-        except sr.UnknownValueError as e:
-            logging.error(f"Chunk {index} could not be understood: {video_id} - {e}")
-            return (index, "")
-        except sr.RequestError as e:
-            logging.error(f"Could not request results from Google Speech Recognition service for chunk {index}: {video_id} - {e}")
-            return (index, "")
-
-def transcribe_audio_chunks(chunks, video_id):
-    # with ThreadPoolExecutor() as executor:
-    #     futures = [executor.submit(transcribe_chunk, chunk, i, video_id) for i, chunk in enumerate(chunks)]
-    #     futures = [transcribe_chunk(chunk, i, video_id) for i, chunk in enumerate(chunks)]
-    #     results = [future.result() for future in futures]
-    #     results.sort(key=lambda x: x[0])  # Sort by index to maintain order
-    #     full_transcript = " ".join([result[1] for result in results])
-    #     return full_transcript\
-    
-    # no multi-threading
-    results = [transcribe_chunk(chunk, i, video_id) for i, chunk in enumerate(chunks)]
-    full_transcript = " ".join([result[1] for result in results])
-    return full_transcript
+# no multi-threading: process_video recognizes one chunk at a time (see transcription.py)
 
 # Step 4: Process video file
-def process_video(video_file, output_file, verbose=False):
-    # Extract audio from video
-    # video = VideoFileClip(video_file)
+def process_video(video_file, output_file, verbose=False, vad=False, sample_rate=16000, sample_width=2):
+    # a video that fails is logged and skipped; its journal is kept, so the next run only recognizes the missing chunks
     video_id = os.path.splitext(video_file)[0].split('/')[-1]
-    # audio = video.audio
-    # video.close()  # Close the video to free up resources
-
     try:
-        audio_segment = AudioSegment.from_file(video_file, format="mp4")
-    except IndexError as e:
+        return transcription.process_video(video_file, output_file, verbose, 1, vad, sample_rate, sample_width)
+    except CouldntDecodeError as e:
         logging.error(f"Could not extract audio from video: {video_id} - {e}")
-        return ""
-
-
-    # Split the audio into chunks of 1 minute (60000 milliseconds)
-    audio_chunks = split_audio(audio_segment, 60000) # I passed the audio_segment instead of the audio_file
-
-    # Transcribe the audio chunks
-    full_transcript = transcribe_audio_chunks(audio_chunks, video_id)
-    logging.info(f"Transcript Completed: {video_id}")
-    #print(f"Transcript for {video_file}: ", full_transcript)
-
-    transcript_file = os.path.join(output_file, video_id + '.txt')
-    #transcript_file = os.path.splitext(video_file)[0] + '.txt'
-    
-    with open(transcript_file, 'w') as f:
-        f.write(full_transcript)
-    logging.info(f"Transcript saved to: {transcript_file}: {video_file}")
-    
-    if verbose:
-        print(f"Transcript saved to: {transcript_file}")
-        
-    return full_transcript
+    except chunk_journal.IncompleteTranscriptError as e:
+        logging.error(f"Transcript incomplete: {e}")
+    return ""
 
 # Step 5: Process all video files
-def process_videos(video_files, output_file, verbose=False):
+def process_videos(video_files, output_file, verbose=False, vad=False, sample_rate=16000, sample_width=2):
     for video_file in tqdm(video_files, desc="Processing video files") if verbose else video_files:
-        transcript = process_video(video_file, output_file, verbose)
+        transcript = process_video(video_file, output_file, verbose, vad, sample_rate, sample_width)
     
-def main(video_files, output_file, verbose=False):
+def main(video_files, output_file, verbose=False, backend='google', backend_options=None, vad=False,
+         cache=None, cache_size=1024, sample_rate=16000, sample_width=2, manifest_path=None, store=None):
+    transcription.configure(backend, backend_options, cache, cache_size, manifest_path, store)
     if verbose:
         print(f"Processing {len(video_files)} video files")
-    process_videos(video_files, output_file, verbose)
+    process_videos(video_files, output_file, verbose, vad, sample_rate, sample_width)
 
 
 if __name__ == '__main__':
@@ -136,9 +96,19 @@ if __name__ == '__main__':
         video_files = [video_file.replace("\\","/") for video_file in video_files]
         # only videos in videos or videos4 folder
         video_files = [video_file for video_file in video_files if  os.path.splitext(video_file.strip())[0].split('/')[-2] == 'videos6'] # os.path.splitext(video_file.strip())[0].split('/')[-2] == 'videos' or
-        # exclude the files that the transcript already exists
-        video_files = [video_file.strip() for video_file in video_files if not os.path.exists(os.path.join(output_path, os.path.splitext(video_file.strip())[0].split('/')[-1] + '.txt'))]
-        #video_files = [video_file.strip() for video_file in video_files]
+        video_files = [video_file.strip() for video_file in video_files]
+    # exclude the files that the transcript already exists (one query on the manifest instead of a file check per video)
+    tracker = manifest.configure(args.manifest)
+    if args.store:
+        # the transcripts are in the store, not .txt files in the output path
+        tracker.mark_done(transcript_store.TranscriptStore(args.store).ids(), 'transcribe')
+    else:
+        tracker.bootstrap('transcribe', output_path, '.txt')
+    video_ids = [os.path.splitext(video_file)[0].split('/')[-1] for video_file in video_files]
+    tracker.add(video_ids, 'transcribe')
+    remaining = tracker.remaining('transcribe')
+    video_files = [video_file for video_file, video_id in zip(video_files, video_ids) if video_id in remaining]
     print(f"Number of video files: {len(video_files)}")
     # process the videos
-    main(video_files,output_path, verbose)
+    main(video_files,output_path, verbose, args.backend, recognizers.parse_options(args.backend_option), args.vad,
+         args.cache, args.cache_size, args.sample_rate, args.sample_width, args.manifest, args.store)
@@ -0,0 +1,113 @@
+"""
+This file keeps a persistent, content-addressed cache of chunk transcripts (SQLite).
+
+A chunk is keyed by the SHA-256 of its normalized PCM (16 kHz, mono, 16-bit) and the identity of
+the recognizer backend, so identical audio is recognized once: re-runs after a crash, a changed
+output directory, creator reposts and sponsor cross-posts all hit the cache.
+The cache is bounded by the total size of the stored transcripts; the least recently used
+entries are evicted first.
+
+The cache can be shared by threads and processes (one connection per thread, WAL journal).
+"""
+
+import time
+import hashlib
+import logging
+from audio_normalize import normalize_pcm
+import shared_state
+
+# the canonical PCM format that is hashed
+KEY_RATE = 16000
+KEY_WIDTH = 2
+
+
+def normalized_pcm(chunk):
+    """
+    Convert a PCMChunk to the canonical format (16 kHz, mono, 16-bit) used for the cache key.
+    """
+    return normalize_pcm(chunk, KEY_RATE, KEY_WIDTH).data
+
+
+class TranscriptCache(shared_state.SQLiteFile):
+    """
+    Chunk transcript cache stored in a SQLite file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite file (created if missing).
+    max_bytes : int, optional
+        The maximum total size of the stored transcripts. Older entries are evicted above it.
+    """
+    # check the size bound every this many insertions
+    EVICT_EVERY = 100
+
+    def __init__(self, path, max_bytes=1024 ** 3):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self._inserts = 0
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS chunks (
+                                key TEXT PRIMARY KEY,
+                                backend TEXT NOT NULL,
+                                transcript TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created REAL NOT NULL,
+                                accessed REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_accessed ON chunks (accessed)")
+
+    @staticmethod
+    def key(chunk, backend):
+        """
+        Get the cache key of a PCMChunk for a backend identity.
+        """
+        digest = hashlib.sha256(normalized_pcm(chunk))
+        digest.update(b'\0' + backend.encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Get the cached transcript of a key, or None when it is not cached.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT transcript FROM chunks WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE chunks SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, backend, transcript):
+        """
+        Store the transcript of a key.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, backend, transcript, len(transcript.encode()), now, now))
+        self._inserts += 1
+        if self._inserts % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache is below 90% of max_bytes.
+        """
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM chunks").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            target = total - int(self.max_bytes * 0.9)
+            # the oldest entries whose running size covers the excess
+            cutoff = conn.execute("""SELECT accessed FROM (
+                                         SELECT accessed, SUM(size) OVER (ORDER BY accessed) AS running
+                                         FROM chunks)
+                                     WHERE running >= ? ORDER BY accessed LIMIT 1""", (target,)).fetchone()
+            deleted = conn.execute("DELETE FROM chunks WHERE accessed <= ?", (cutoff[0],)).rowcount
+        logging.info(f"Transcript cache evicted {deleted} entries")
+        return deleted
+
+
+# process-wide cache: configure(path, max_bytes) enables it (path=None disables it), get_cache() returns it or None
+_CACHE = shared_state.ProcessGlobal(lambda path=None, max_bytes=1024 ** 3: TranscriptCache(path, max_bytes) if path else None)
+configure = _CACHE.configure
+get_cache = _CACHE.get
@@ -1,125 +1,272 @@
 """
-File: video_download.py
-Description: This file includes the function to downlod transcripts facebook videos
+File: transcript_download_sponsors.py
+Description: This file includes the function to downlod transcripts facebook videos (sponsors).
+Existing captions are far cheaper than speech recognition, so the transcripts are taken from the
+subtitles first:
+* one extraction per URL (extract_info without download); the subtitles it selected are then
+  written from the same info dict (no second extraction)
+* manual subtitles are preferred over automatic captions; srt and vtt are usable, and the
+  subtitle text (without cue numbers, timings and tags) is saved as <video_id>.txt, like the ASR transcripts
+* the videos without usable subtitles are downloaded (audio only) and transcribed with
+  transcribe_parallel.process_video (--no-asr only lists them)
+The manifest ('transcribe' stage) keeps track of the videos that have a transcript either way.
+The info dicts are stored in the metadata catalog, and the videos the catalog knows to have no
+subtitles in the requested languages go to the ASR fallback without an extraction.
+
+Usage: python transcript_download_sponsors.py -o transcripts/Sponsors -c 8 -w 4
 Created by: Shahryar Doosti (doosti@chapman.edu)
 Date: 6/2/2024
 """
 
 import os
-import pandas as pd
-import yt_dlp as youtube_dl
-import logging
-import datetime
+import re
+import html
+import json
 import time
+import logging
+import argparse
+from functools import partial
+import yt_dlp as youtube_dl
+import ydl_session
+import manifest
+import metadata_catalog
+import recognizers
+import download_retry
+import video_download
+import transcribe_parallel
+from download_orchestrator import run_downloads
 
 PATH = os.path.dirname(__file__)
-print(PATH)
 OUTPUT_PATH = os.path.join(PATH, 'transcripts','Sponsors')
+VIDEO_PATH = os.path.join(PATH, 'videos', 'Sponsors')
+
+# the subtitle formats that can be turned into a transcript, in order of preference
+TEXT_FORMATS = ('srt', 'vtt')
+
+SUBTITLE_OPTS = {
+    'skip_download': True,                  # Skip downloading the video
+    'writesubtitles': True,                 # Write the subtitles to a file
+    'writeautomaticsub': True,              # Write automatic captions if there are no subtitles
+    'subtitleslangs': ['en.*'],             # English subtitles (en, en_US, ...)
+    'subtitlesformat': '/'.join(TEXT_FORMATS) + '/best',
+    'ignore_no_formats_error': True,        # the video formats are not needed
+    'noplaylist': True,                     # Disable downloading playlists, only single video
+}
+
+# cue numbers, timing lines (srt and vtt), vtt headers and blocks, markup
+_CUE_NUMBER = re.compile(r'^\d+$')
+_VTT_BLOCK = re.compile(r'^(WEBVTT|NOTE|STYLE|REGION|Kind:|Language:)')
+_TAG = re.compile(r'<[^>]+>|\{\\[^}]*\}')
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Download the transcripts of the sponsor videos (subtitles first, ASR fallback)')
+    parser.add_argument('--csv', help='The CSV file of the videos (video_id, video_url); defaults to the sponsors CSV', default=None)
+    parser.add_argument('-o', '--output', help='The output path to store the subtitles and transcripts', default=OUTPUT_PATH)
+    parser.add_argument('--videos', help='The folder of the downloaded audio (ASR fallback)', default=VIDEO_PATH)
+    parser.add_argument('--langs', help='The subtitle languages (regular expressions)', nargs='+', default=['en.*'])
+    parser.add_argument('-c', '--concurrency', help='The number of subtitle extractions and downloads at once', type=int, default=8)
+    parser.add_argument('--rate', help='The extractions started per second per host (0 = unlimited)', type=float, default=1.0)
+    parser.add_argument('--no-asr', help='Do not download and transcribe the videos without subtitles', action='store_true')
+    parser.add_argument('-w', '--workers', help='Number of transcription processes (default: number of CPUs)', type=int, default=None)
+    parser.add_argument('-b', '--backend', help='The speech recognition backend', choices=list(recognizers.BACKENDS), default='google')
+    parser.add_argument('--backend-option', help='An option of the backend as KEY=VALUE', action='append', default=[])
+    parser.add_argument('--manifest', help='The path to the manifest database (SQLite file)', default=os.path.join(PATH, 'manifest.db'))
+    parser.add_argument('--catalog', help='The path to the metadata catalog (SQLite file)', default=os.path.join(PATH, 'metadata.db'))
+    parser.add_argument('-v', '--verbose', help='Print the log messages', action='store_true')
+    return parser.parse_args()
+
+
+def subtitle_text(subtitle_file):
+    """
+    Get the text of an srt or vtt subtitle file (one line per cue, repeated lines dropped).
+    """
+    lines = []
+    with open(subtitle_file, encoding='utf-8', errors='replace') as f:
+        raw = [line.strip() for line in f]
+    for i, line in enumerate(raw):
+        # a line of digits is a cue number only before a timing line (else it is caption text, e.g. "2024")
+        cue_number = _CUE_NUMBER.match(line) and i + 1 < len(raw) and '-->' in raw[i + 1]
+        if not line or cue_number or '-->' in line or _VTT_BLOCK.match(line):
+            continue
+        line = html.unescape(_TAG.sub('', line)).strip()
+        # automatic captions repeat the previous line while the next one is typed
+        if line and (not lines or lines[-1] != line):
+            lines.append(line)
+    return " ".join(lines)
+
+
+def usable_subtitles(info):
+    """
+    Get the first selected subtitle track that can be turned into text as {lang: track}, or {}.
+    """
+    for lang, track in (info.get('requested_subtitles') or {}).items():
+        if track.get('ext') in TEXT_FORMATS:
+            return {lang: track}
+    return {}
 
-# Get today's date
-#today = datetime.date.today()
 
-# Configure logging
-logging.basicConfig(filename=os.path.join(PATH, f'download_transcript_sponsors.log'), level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+def has_subtitles(metadata, langs):
+    """
+    Whether the catalog row of a video lists subtitles or captions in one of the languages (regular expressions).
+    """
+    available = json.loads(metadata['subtitles'] or '[]') + json.loads(metadata['automatic_captions'] or '[]')
+    return any(re.fullmatch(pattern, lang) for pattern in langs for lang in available)
+
 
-def download_transcript(url, video_id=False, output_path=OUTPUT_PATH, verbose=True):
+def download_transcript(url, video_id=False, output_path=OUTPUT_PATH, verbose=True, langs=None):
     """
-    Download a transcript from the given URL.
+    Download the subtitles of a video and save their text as the transcript.
 
     Parameters
     ----------
     url : str
-        The URL of the video to download.
+        The URL of the video.
     video_id : str, optional
         The ID of the video. If not provided, it will be extracted from the URL.
     output_path : str, optional
-        The path to save the downloaded video.
+        The folder to save the subtitles and the transcript (<video_id>.txt).
     verbose : bool, optional
         Whether to print the status of the download operation.
+    langs : list, optional
+        The subtitle languages (regular expressions); defaults to English.
 
-    Returns the status of the download operation.
+    Returns
     -------
+    True if the transcript was saved, None if the video has no usable subtitles (needs ASR), False on errors.
     """
     if video_id is False:
-        video_id = url.split('=')[-1] 
-
-    ydl_opts = {
-        'skip_download': True,                                # Skip downloading the video
-        'write-sub': True,                                   # Write the subtitles to a file
-        'write-auto-sub': True,                              # Write automatic subtitles (if available)
-        'writeauto_sub': True,                                # Write automatic subtitles (if available)
-        'subtitleslangs': ['en'],                             # Download subtitles in English
-        'list-subs': True,                                   # List the available subtitles
-        'outtmpl': output_path+f"/{video_id}.srt",        # Include the specified path
-        'sub-format': 'srt',        # Specify the subtitle format
-        'noplaylist': True,                                   # Disable downloading playlists, only single video
-    }
-    print(output_path+f"/{video_id}.srt")
+        video_id = url.rstrip('/').split('/')[-1].split('=')[-1]
+    opts = dict(SUBTITLE_OPTS, subtitleslangs=list(langs)) if langs else SUBTITLE_OPTS
+    session = ydl_session.get_session(opts)
+    transcript_file = os.path.join(output_path, f"{video_id}.txt")
+    manifest.started(video_id, 'transcribe')
+    start = time.time()
+    catalog = metadata_catalog.get_catalog()
+    known = catalog.get(video_id) if catalog is not None else None
+    if known and known['error'] is None and not has_subtitles(known, opts['subtitleslangs']):
+        # the catalog has the info dict already: no extraction needed to know there are no subtitles
+        manifest.failed(video_id, 'transcribe', 'no subtitles (catalog)', time.time() - start, 'no_subtitles')
+        if verbose: print(f"No subtitles: {url}")
+        return None
     try:
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            subtitle_url = ydl.prepare_filename(info_dict).rsplit('.', 1)[0] + '.en.srt'
-            ydl.download([url])    
-        logging.info(f"Subtitle download completed: {url}")
-        if verbose: 
+        # one extraction; the subtitles are selected by it and written from the same info dict
+        info = download_retry.retry(lambda: session.extract_info(url), video_id)
+        metadata_catalog.record(video_id, info)
+        subtitles = usable_subtitles(info)
+        if not subtitles:
+            logging.info(f"No subtitles: {video_id}")
+            manifest.failed(video_id, 'transcribe', 'no usable subtitles', time.time() - start, 'no_subtitles')
+            if verbose: print(f"No subtitles: {url}")
+            return None
+        info['requested_subtitles'] = subtitles
+        download_retry.retry(lambda: session.process_info(info, outtmpl=os.path.join(output_path, f"{video_id}.%(ext)s")),
+                             video_id)
+        lang, track = next(iter(subtitles.items()))
+        subtitle_file = track.get('filepath') or os.path.join(output_path, f"{video_id}.{lang}.{track['ext']}")
+        text = subtitle_text(subtitle_file)
+        if not text:
+            logging.info(f"Empty subtitles: {video_id}")
+            manifest.failed(video_id, 'transcribe', 'empty subtitles', time.time() - start, 'no_subtitles')
+            return None
+        # written atomically, like the ASR transcripts (a partial .txt would be skipped as done)
+        with open(transcript_file + '.tmp', 'w') as f:
+            f.write(text)
+        os.replace(transcript_file + '.tmp', transcript_file)
+        manifest.finished(video_id, 'transcribe', len(text.encode()), time.time() - start)
+        logging.info(f"Subtitle download completed: {video_id} ({lang}, {track['ext']})")
+        if verbose:
             print(f"Subtitle download completed: {url}")
-            print(f"Subtitle saved to: {subtitle_url}")
+            print(f"Subtitle saved to: {subtitle_file}")
         return True
     except youtube_dl.utils.DownloadError as e:
         logging.error(f"Download error: {video_id} - {e}")
+        download_retry.record_failure(video_id, e, time.time() - start, stage='transcribe')
         if verbose: print(f"Download error: {e}")
         return False
     except youtube_dl.utils.ExtractorError as e:
         logging.error(f"Extractor error: {video_id} - {e}")
+        download_retry.record_failure(video_id, e, time.time() - start, stage='transcribe')
         if verbose: print(f"Extractor error: {e}")
         return False
-    except youtube_dl.utils.PostProcessingError as e:
-        logging.error(f"Post-processing error: {video_id} - {e}")
-        if verbose: print(f"Post-processing error: {e}")
-        return False
     except Exception as e:
         logging.error(f"An unexpected error occurred: {video_id} - {e}")
+        download_retry.record_failure(video_id, e, time.time() - start, stage='transcribe')
         if verbose: print(f"An unexpected error occurred: {e}")
         return False
 
 
-def sponsor_data(file_path = os.path.join(PATH, 'VideoDownloads','videos_sponsors.csv')):
+def sponsor_data(file_path=None):
     """
     Load data from a CSV file.
 
     Parameters
     ----------
-    file_path : str
-        The path to the CSV file.
+    file_path : str, optional
+        The path to the CSV file; defaults to the sponsors CSV.
 
     Returns
     -------
     pandas.DataFrame
-        The loaded data as a pandas DataFrame.
+        The video_id and video_url columns.
+    """
+    return video_download.video_data('sponsors', file_path)
+
+
+def asr_fallback(data, video_path, output_path, concurrency=8, rate=1.0, verbose=False, workers=None,
+                 backend='google', backend_options=None, manifest_path=None):
+    """
+    Download the audio of the videos without subtitles and transcribe it (transcribe_parallel.process_video).
+
+    Returns
+    -------
+    (completed, failures) of transcribe_parallel.process_videos.
     """
-    return pd.read_csv(file_path)
+    os.makedirs(video_path, exist_ok=True)
+    jobs = video_download.select_videos(data, video_path, ext=video_download.AUDIO_EXT)
+    run_downloads(partial(video_download.download_video, verbose=verbose, audio_only=True), jobs, concurrency, rate or None)
+    video_files = [video_download.find_media(video_path, video_id) for video_id in data.video_id.astype(str)]
+    video_files = [video_file for video_file in video_files if video_file is not None]
+    print(f"Videos without subtitles to transcribe: {len(video_files)}")
+    return transcribe_parallel.process_videos(video_files, output_path, verbose, backend=backend,
+                                              backend_options=backend_options, workers=workers,
+                                              manifest_path=manifest_path)
+
 
 def main():
-    # data = sponsor_data()
-    # for k,row in data.iterrows():
-    #     #path = os.path.join(OUTPUT_PATH, f"{row.video_id}.mp4")
-    #     # if os.path.isfile(path):
-    #     #     logging.info(f"Video already exists: {row.video_id}")
-    #     #     continue
-    #     print(f"------------ {k+1} - id:{row.video_id}")
-    #     try:
-    #         _ = download_transcript(row.video_url, row.video_id)
-    #     except Exception:
-    #         print("Not successful")
-    #     time.sleep(1)
-    url = "https://www.facebook.com/cnn/videos/981577819286073"
-    try:
-        _ = download_transcript(url)
-    except Exception:
-        print("Not successful")
+    args = get_args()
+    os.makedirs(args.output, exist_ok=True)
+    # Configure logging
+    logging.basicConfig(filename=os.path.join(PATH, 'download_transcript_sponsors.log'), level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
 
-if __name__ == '__main__':
-    main()
+    # Step 1: the videos without a transcript (subtitles or ASR)
+    tracker = manifest.configure(args.manifest)
+    metadata_catalog.configure(args.catalog)
+    data = sponsor_data(args.csv)
+    tracker.bootstrap('transcribe', args.output, '.txt')
+    tracker.add(data.video_id, 'transcribe')
+    data = data[data.video_id.astype(str).isin(tracker.remaining('transcribe'))]
+    print(f"Number of videos: {len(data)}")
+
+    # Step 2: the subtitles (one extraction per video)
+    jobs = [(r[1], str(r[0]), args.output) for r in data.to_numpy()]   # (url, video_id, output_path)
+    results, _ = run_downloads(partial(download_transcript, verbose=args.verbose, langs=args.langs),
+                               jobs, args.concurrency, args.rate or None)
+    no_subtitles = {result.args[1] for result in results if result.error is None and result.result is None}
+    print(f"Subtitles: {sum(result.result is True for result in results)}, No subtitles: {len(no_subtitles)}, "
+          f"Failed: {sum(result.error is not None or result.result is False for result in results)}")
+
+    # Step 3: speech recognition for the rest
+    if no_subtitles and not args.no_asr:
+        completed, failures = asr_fallback(data[data.video_id.astype(str).isin(no_subtitles)], args.videos, args.output,
+                                           args.concurrency, args.rate, args.verbose, args.workers, args.backend,
+                                           recognizers.parse_options(args.backend_option), args.manifest)
+        print(f"Transcribed: {len(completed)}, Failed: {len(failures)}")
 
 
+if __name__ == '__main__':
+    main()
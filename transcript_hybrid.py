@@ -14,6 +14,9 @@ from pydub import AudioSegment
 import io
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import numpy as np
+import audio_stream
+import chunk_recognition
+import recognizers
 
 PATH = os.path.dirname(__file__)
 
@@ -24,6 +27,9 @@ videos = ['335673943535848.mp4',
 
 video_files = [os.path.join(PATH, video) for video in videos]
 
+# the speech recognition backend (see recognizers.BACKENDS), e.g. 'stub' to run without the network
+BACKEND = 'google'
+
 # Step 1: Extract audio from video
 def extract_audio(video_file):
     audio_file = os.path.splitext(video_file)[0] + '.wav'
@@ -82,67 +88,28 @@ def split_audio(audio, chunk_length_ms):
 #     return full_transcript
 
 # Step 3: Transcribe audio chunks (with parallelization)
-def transcribe_chunk(chunk, index):
-    recognizer = sr.Recognizer()
-    chunk_io = io.BytesIO()
-    chunk.export(chunk_io, format="wav")
-    chunk_io.seek(0)
-
-    with sr.AudioFile(chunk_io) as source:
-        audio_data = recognizer.record(source)
-        try:
-            transcript = recognizer.recognize_google(audio_data)
-            return (index, transcript)
-        except sr.UnknownValueError:
-            return (index, "")
-        except sr.RequestError as e:
-            return (index, "")
-
-def transcribe_audio_chunks(chunks):
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(transcribe_chunk, chunk, i) for i, chunk in enumerate(chunks)]
-        results = [future.result() for future in futures]
-        results.sort(key=lambda x: x[0])  # Sort by index to maintain order
-        full_transcript = " ".join([result[1] for result in results])
-        return full_transcript
+def transcribe_chunk(chunk, index, backend=BACKEND):
+    recognizer = recognizers.get_backend(backend)
+    try:
+        transcript = recognizer.recognize(recognizers.pcm_chunk(chunk))
+        return (index, transcript)
+    except sr.UnknownValueError:
+        return (index, "")
+    except sr.RequestError as e:
+        return (index, "")
+
+def transcribe_audio_chunks(chunks, video_id=""):
+    results = chunk_recognition.recognize_chunks(chunks, transcribe_chunk)  # results are in chunk order
+    full_transcript = chunk_recognition.join_results(results, video_id)
+    return full_transcript
 
 # Step 4: Process video file
 def process_video(video_file):
-    # Extract audio from video
-    video = VideoFileClip(video_file)
-
-    # Save audio as .wav file
-    #audio_file = os.path.splitext(video_file)[0] + '.wav'
-    audio = video.audio
-    #audio.write_audiofile(audio_file)
-
-    # Process audio in memory
-    # audio = video.audio
-    # # Convert audio to numpy array
-    # audio_array = audio.to_soundarray(fps=16000) # Convert to 16kHz, required by pydub
-    # # Convert numpy array to AudioSegment
-    # audio_segment = AudioSegment(
-    #     data=audio_array.astype(np.int16).tobytes(),
-    #     sample_width=audio_array.dtype.itemsize,
-    #     frame_rate=16000,
-    #     channels=1
-    # )
-    # Save audio to a temporary buffer
-    #audio_buffer = io.BytesIO(audio.to_bytestring())
-    #audio.write_audiofile(audio_buffer, verbose=False)
-    #audio_buffer.seek(0)
-    # Load audio into pydub AudioSegment
-    #audio_segment = AudioSegment.from_file(audio_buffer, format="wav")
-    audio_segment = AudioSegment.from_file(video_file, format="mp4")
-
-
-    video.close()  # Close the video to free up resources
-
-    # Split the audio into chunks of 1 minute (60000 milliseconds)
-    audio_chunks = split_audio(audio_segment, 60000) # I passed the audio_segment instead of the audio_file
+    # Extract the audio (16 kHz mono, single ffmpeg pass) in chunks of 1 minute (60000 milliseconds)
+    audio_chunks = audio_stream.extract_audio(video_file, 60000)
 
     # Transcribe the audio chunks
-    full_transcript = transcribe_audio_chunks(audio_chunks)
+    full_transcript = transcribe_audio_chunks(audio_chunks, os.path.basename(video_file))
     print(f"Transcript for {video_file}: ", full_transcript)
 
     return full_transcript
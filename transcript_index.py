@@ -0,0 +1,286 @@
+"""
+This file keeps a positional inverted index of the transcripts on disk, for keyword, phrase and keyword-in-context (KWIC) queries.
+
+The index is a folder of segments; each segment is a batch of added transcripts stored as numpy
+arrays that are memory-mapped when queried:
+* tokens.npy: the term ids of all the tokens of the segment, transcript after transcript
+* docs.npy: the token offset where each transcript starts (plus the end)
+* postings.npy and terms.npy: the token positions sorted by term, and where each term starts in them
+vocab.json maps the terms to their ids (append only) and meta.json lists the segments and the
+transcripts they hold. A query reads the postings of one term per segment; phrases are checked
+against the token array, and the words around a hit (KWIC) are read from it too, so nothing is
+re-split. New transcripts are added as a new segment; a transcript added again replaces the old one.
+A transcript can be added with a version (e.g. its hash or modification time), kept in meta.json,
+so that callers re-index only the transcripts whose version changed (outdated()).
+
+The tokens are the lower case words of the transcripts (letters, digits and apostrophes).
+
+The command line adds the transcripts that are new or changed since they were indexed (the
+updated time of the store rows, the path, size and mtime of the files).
+
+Usage: python transcript_index.py --index transcript_index --store transcripts.db
+       python transcript_index.py --index transcript_index -d transcripts transcripts2
+       python transcript_index.py --index transcript_index -q "brought to you by" --window 5
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import argparse
+from collections import namedtuple
+import numpy as np
+
+_WORD = re.compile(r"[\w']+")
+
+# a match: the video, its token position in the transcript, and the words before, of and after the match
+KWICHit = namedtuple('KWICHit', ['video_id', 'position', 'left', 'match', 'right'])
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Build and query the positional index of the transcripts')
+    parser.add_argument('--index', help='The index folder', required=True)
+    parser.add_argument('--store', help='Add the transcripts of the transcript store (SQLite file)', default=None)
+    parser.add_argument('-d', '--directories', help='Add the transcript folders (later ones override earlier ones)', nargs='+', default=[])
+    parser.add_argument('-q', '--query', help='A word or phrase to show in context', default=None)
+    parser.add_argument('--window', help='The number of words shown on each side of a match', type=int, default=5)
+    parser.add_argument('--limit', help='The maximum number of matches shown', type=int, default=50)
+    return parser.parse_args()
+
+
+def tokenize(text):
+    """
+    The lower case words of a text.
+    """
+    return _WORD.findall(text.lower())
+
+
+class TranscriptIndex:
+    """
+    A positional inverted index stored in a folder.
+
+    Parameters
+    ----------
+    path : str
+        The index folder (created if missing).
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.vocab = self._load('vocab.json', [])
+        self.ids = {term: i for i, term in enumerate(self.vocab)}
+        meta = self._load('meta.json', {'segments': [], 'owner': {}})
+        self.segments = meta['segments']      # segment names, oldest first
+        self.owner = meta['owner']            # video_id -> the segment that holds its latest transcript
+        self.versions = meta.get('versions', {})  # video_id -> the version of its latest transcript
+        self._cache = {}
+
+    def _load(self, name, default):
+        path = os.path.join(self.path, name)
+        if not os.path.isfile(path):
+            return default
+        with open(path) as f:
+            return json.load(f)
+
+    def _save(self, name, value):
+        # written atomically: a crash leaves the previous version
+        path = os.path.join(self.path, name)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(value, f)
+        os.replace(path + '.tmp', path)
+
+    def __len__(self):
+        return len(self.owner)
+
+    def __contains__(self, video_id):
+        return str(video_id) in self.owner
+
+    def outdated(self, video_id, version):
+        """
+        Whether a video is not indexed, or was indexed with another version of its transcript.
+        """
+        video_id = str(video_id)
+        return video_id not in self.owner or self.versions.get(video_id) != version
+
+    def add(self, transcripts, segment_tokens=20_000_000):
+        """
+        Add transcripts (video_id, text) or (video_id, text, version) as new segments of at most about segment_tokens tokens.
+
+        Returns
+        -------
+        int
+            The number of transcripts added.
+        """
+        count = 0
+        batch, size = [], 0
+        for video_id, text, *version in transcripts:
+            if not isinstance(text, str):
+                continue
+            tokens = tokenize(text)
+            batch.append((str(video_id), (tokens, version[0] if version else None)))
+            size += len(tokens)
+            if size >= segment_tokens:
+                count += self._write_segment(batch)
+                batch, size = [], 0
+        if batch:
+            count += self._write_segment(batch)
+        return count
+
+    def _write_segment(self, batch):
+        # a later transcript of the same video in the batch replaces the earlier one
+        docs = list(dict(batch).items())
+        versions = {video_id: version for video_id, (_, version) in docs}
+        docs = [(video_id, tokens) for video_id, (tokens, _) in docs]
+        for _, tokens in docs:
+            for token in tokens:
+                if token not in self.ids:
+                    self.ids[token] = len(self.vocab)
+                    self.vocab.append(token)
+        tokens = np.fromiter((self.ids[token] for _, doc in docs for token in doc), dtype=np.uint32)
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum([len(doc) for _, doc in docs], out=offsets[1:])
+        # postings: the positions grouped by term (a stable sort keeps them in order within a term)
+        postings = np.argsort(tokens, kind='stable').astype(np.int64)
+        terms = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tokens, minlength=len(self.vocab)), out=terms[1:])
+
+        name = f"seg_{len(self.segments):05d}_{int(time.time())}"
+        folder = os.path.join(self.path, name)
+        os.makedirs(folder)
+        np.save(os.path.join(folder, 'tokens.npy'), tokens)
+        np.save(os.path.join(folder, 'docs.npy'), offsets)
+        np.save(os.path.join(folder, 'postings.npy'), postings)
+        np.save(os.path.join(folder, 'terms.npy'), terms)
+        with open(os.path.join(folder, 'video_ids.json'), 'w') as f:
+            json.dump([video_id for video_id, _ in docs], f)
+
+        # the vocabulary first: a segment listed in meta.json must only use known terms
+        self._save('vocab.json', self.vocab)
+        self.segments.append(name)
+        for video_id, _ in docs:
+            self.owner[video_id] = name
+            if versions[video_id] is None:
+                self.versions.pop(video_id, None)
+            else:
+                self.versions[video_id] = versions[video_id]
+        self._save('meta.json', {'segments': self.segments, 'owner': self.owner, 'versions': self.versions})
+        logging.info(f"Index segment {name}: {len(docs)} transcripts, {len(tokens)} tokens")
+        return len(docs)
+
+    def _segment(self, name):
+        # the memory-mapped arrays of a segment
+        if name not in self._cache:
+            folder = os.path.join(self.path, name)
+            arrays = {key: np.load(os.path.join(folder, f'{key}.npy'), mmap_mode='r')
+                      for key in ('tokens', 'docs', 'postings', 'terms')}
+            with open(os.path.join(folder, 'video_ids.json')) as f:
+                arrays['video_ids'] = json.load(f)
+            self._cache[name] = arrays
+        return self._cache[name]
+
+    def _find(self, words, video_ids=None):
+        # (segment name, segment arrays, start positions, doc indices) of a phrase, per segment
+        ids = [self.ids.get(word) for word in words]
+        if not ids or None in ids:
+            return
+        wanted = None if video_ids is None else {str(video_id) for video_id in video_ids}
+        for name in self.segments:
+            segment = self._segment(name)
+            terms = segment['terms']
+            if ids[0] + 1 >= len(terms):
+                continue    # the term is newer than the segment
+            positions = np.asarray(segment['postings'][terms[ids[0]]:terms[ids[0] + 1]])
+            if not len(positions):
+                continue
+            docs = np.searchsorted(segment['docs'], positions, side='right') - 1
+            # the rest of the phrase: the next tokens, within the same transcript
+            tokens, ends = segment['tokens'], segment['docs'][docs + 1]
+            keep = positions + len(ids) <= ends
+            for offset, term in enumerate(ids[1:], 1):
+                keep[keep] &= np.asarray(tokens[positions[keep] + offset]) == term
+            positions, docs = positions[keep], docs[keep]
+            # only the latest transcript of a video (and the wanted ones)
+            video_ids_of = segment['video_ids']
+            keep = np.fromiter((self.owner.get(video_ids_of[d]) == name and (wanted is None or video_ids_of[d] in wanted)
+                                for d in docs), dtype=bool, count=len(docs))
+            if keep.any():
+                yield name, segment, positions[keep], docs[keep]
+
+    def count(self, query, video_ids=None):
+        """
+        The number of occurrences of a word or phrase.
+        """
+        return sum(len(positions) for _, _, positions, _ in self._find(tokenize(query), video_ids))
+
+    def documents(self, query, video_ids=None):
+        """
+        The ids of the videos whose transcript contains a word or phrase, with the number of occurrences.
+        """
+        found = {}
+        for _, segment, _, docs in self._find(tokenize(query), video_ids):
+            for doc, n in zip(*np.unique(docs, return_counts=True)):
+                found[segment['video_ids'][doc]] = int(n)
+        return found
+
+    def kwic(self, query, window=5, video_ids=None, limit=None):
+        """
+        The matches of a word or phrase with the words around them (keyword in context).
+
+        Parameters
+        ----------
+        query : str
+            A word or phrase.
+        window : int, optional
+            The number of words on each side.
+        video_ids : iterable, optional
+            Only search these videos.
+        limit : int, optional
+            The maximum number of matches.
+
+        Returns
+        -------
+        list
+            KWICHits (video_id, position in the transcript, left words, matched words, right words).
+        """
+        words = tokenize(query)
+        hits = []
+        for _, segment, positions, docs in self._find(words, video_ids):
+            tokens, offsets = segment['tokens'], segment['docs']
+            for position, doc in zip(positions, docs):
+                start, end = offsets[doc], offsets[doc + 1]
+                context = [self.vocab[t] for t in tokens[max(start, position - window):min(end, position + len(words) + window)]]
+                before = position - max(start, position - window)
+                hits.append(KWICHit(segment['video_ids'][doc], int(position - start), context[:before],
+                                    context[before:before + len(words)], context[before + len(words):]))
+                if limit and len(hits) >= limit:
+                    return hits
+        return hits
+
+
+if __name__ == '__main__':
+    args = get_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    index = TranscriptIndex(args.index)
+    if args.store:
+        import transcript_store
+        store = transcript_store.TranscriptStore(args.store)
+        # only the transcripts that are new or updated since they were indexed
+        changed = [(video_id, updated) for video_id, updated in store.updated().items() if index.outdated(video_id, updated)]
+        print(f"Added: {index.add((video_id, store.get(video_id), updated) for video_id, updated in changed)} transcripts")
+    if args.directories:
+        from aggregate_transcripts import scan_transcripts, read_transcript
+        # only the files that are new or changed (path, size, mtime) since they were indexed
+        files = scan_transcripts(args.directories)
+        versions = [(video_id, path, f"{path}:{size}:{mtime}") for video_id, path, size, mtime in files.itertuples(index=False)]
+        transcripts = ((video_id, read_transcript(path), version) for video_id, path, version in versions if index.outdated(video_id, version))
+        print(f"Added: {index.add(transcripts)} transcripts")
+    if args.query:
+        start = time.time()
+        hits = index.kwic(args.query, args.window, limit=args.limit)
+        for hit in hits:
+            print(f"{hit.video_id:>20}  {' '.join(hit.left):>40} [{' '.join(hit.match)}] {' '.join(hit.right)}")
+        print(f"{index.count(args.query)} matches in {len(index.documents(args.query))} transcripts ({time.time() - start:.3f}s)")
@@ -0,0 +1,196 @@
+"""
+This file keeps the transcripts in one packed store (SQLite) keyed by video_id instead of one .txt file per video.
+
+* the transcription workers write each transcript in one transaction (--store), instead of a
+  .txt file; the rows of a bulk import are written in batches of one transaction each
+* a transcript is read by its video_id through the primary key index (no directory walk)
+* scan() reads all transcripts in storage order, in batches (sequential reads of one file
+  instead of opening millions of small files)
+* existing transcript folders are imported with parallel readers and a single writer; a later
+  folder overrides an earlier one for the same video_id (transcripts2 over transcripts), and files
+  whose size and mtime did not change since the last import are skipped
+
+The store can be shared by threads and processes (one connection per thread, WAL journal).
+
+Usage: python transcript_store.py --store transcripts.db -d transcripts transcripts2 -w 16
+"""
+
+import os
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import shared_state
+
+
+def get_args():
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Import transcript folders into the transcript store')
+    parser.add_argument('--store', help='The path to the transcript store (SQLite file)', required=True)
+    parser.add_argument('-d', '--directories', help='The transcript folders (later ones override earlier ones)', nargs='+', required=True)
+    parser.add_argument('-w', '--workers', help='The number of parallel readers', type=int, default=16)
+    parser.add_argument('--batch', help='The number of transcripts written per transaction', type=int, default=1000)
+    return parser.parse_args()
+
+
+def _read(path):
+    with open(path, 'r', errors='replace') as f:
+        return f.read()
+
+
+class TranscriptStore(shared_state.SQLiteFile):
+    """
+    The transcripts stored in a SQLite file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite file (created if missing).
+    """
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS transcripts (
+                                video_id TEXT PRIMARY KEY,
+                                transcript TEXT NOT NULL,
+                                source TEXT,
+                                size INTEGER,
+                                mtime REAL,
+                                updated REAL NOT NULL)""")
+
+    def put(self, video_id, transcript, source=None):
+        """
+        Store (or replace) the transcript of a video.
+        """
+        self.put_many([(video_id, transcript, source, None, None)])
+
+    def put_many(self, rows):
+        """
+        Store many transcripts in one transaction.
+
+        Parameters
+        ----------
+        rows : iterable
+            (video_id, transcript, source, size, mtime) tuples; source, size and mtime describe the imported file (or None).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO transcripts (video_id, transcript, source, size, mtime, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                             ((str(video_id), transcript, source, size, mtime, now) for video_id, transcript, source, size, mtime in rows))
+
+    def get(self, video_id):
+        """
+        Get the transcript of a video, or None.
+        """
+        row = self._connect().execute("SELECT transcript FROM transcripts WHERE video_id = ?", (str(video_id),)).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, video_id):
+        return self._connect().execute("SELECT 1 FROM transcripts WHERE video_id = ?", (str(video_id),)).fetchone() is not None
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+
+    def ids(self):
+        """
+        Get the ids of the stored videos (from the index, without reading the transcripts).
+        """
+        return {row[0] for row in self._connect().execute("SELECT video_id FROM transcripts")}
+
+    def updated(self):
+        """
+        Get the time each transcript was last written, as {video_id: updated} (without reading the transcripts).
+        """
+        return dict(self._connect().execute("SELECT video_id, updated FROM transcripts"))
+
+    def scan(self, batch=10000):
+        """
+        Yield the (video_id, transcript) of every video in storage order.
+        """
+        cursor = self._connect().execute("SELECT video_id, transcript FROM transcripts ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+
+    def to_series(self):
+        """
+        Get the transcripts as a pandas Series indexed by video_id (e.g. for Series.map).
+        """
+        data = pd.read_sql_query("SELECT video_id, transcript FROM transcripts", self._connect(), index_col='video_id')
+        return data['transcript']
+
+    def _imported(self):
+        # source -> (size, mtime) of the imported files
+        return {row[0]: (row[1], row[2]) for row in
+                self._connect().execute("SELECT source, size, mtime FROM transcripts WHERE source IS NOT NULL")}
+
+    def import_directories(self, directories, workers=16, batch=1000, suffix='.txt'):
+        """
+        Import transcript folders: parallel readers, one writer, a later folder overrides an earlier one.
+
+        Returns
+        -------
+        int
+            The number of transcripts imported (unchanged files are skipped).
+        """
+        imported = self._imported()
+        files = {}   # video_id -> (path, size, mtime); later directories override earlier ones
+        for directory in directories:
+            for root, dirs, names in os.walk(directory):
+                for name in names:
+                    if name.endswith(suffix):
+                        path = os.path.join(root, name)
+                        stat = os.stat(path)
+                        files[name[:-len(suffix)]] = (path, stat.st_size, stat.st_mtime)
+        changed = [(video_id, path, size, mtime) for video_id, (path, size, mtime) in files.items()
+                   if imported.get(path) != (size, mtime)]
+        logging.info(f"Importing {len(changed)} of {len(files)} transcripts into {self.path}")
+        count = 0
+        # the reads wait on the disk: many threads keep it busy, the writes stay in this thread
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(changed), batch):
+                chunk = changed[start:start + batch]
+                texts = executor.map(_read, [path for _, path, _, _ in chunk])
+                self.put_many((video_id, text, path, size, mtime) for (video_id, path, size, mtime), text in zip(chunk, texts))
+                count += len(chunk)
+        return count
+
+
+# process-wide store: configure(path) enables it (path=None disables it: transcripts are .txt files),
+# get_store() returns it or None
+_STORE = shared_state.ProcessGlobal(lambda path=None: TranscriptStore(path) if path else None)
+configure = _STORE.configure
+get_store = _STORE.get
+
+
+def commit(video_id, transcript, journal):
+    """
+    Save a finished transcript: in the store when it is enabled (the chunk journal is dropped),
+    else as the .txt file of the journal.
+
+    Returns
+    -------
+    str
+        Where the transcript was saved.
+    """
+    store = get_store()
+    if store is None:
+        journal.commit(transcript)
+        return journal.transcript_file
+    store.put(video_id, transcript)
+    journal.discard()
+    return f"{store.path}:{video_id}"
+
+
+if __name__ == '__main__':
+    args = get_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = TranscriptStore(args.store)
+    start = time.time()
+    count = store.import_directories(args.directories, args.workers, args.batch)
+    print(f"Imported: {count} transcripts in {time.time() - start:.1f}s, stored: {len(store)}")
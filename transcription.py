@@ -0,0 +1,149 @@
+"""
+This file transcribes one video; it is shared by transcribe.py, transcribe_parallel.py and pipeline.py.
+
+* the audio is streamed in chunks of 1 minute, downmixed and resampled (16 kHz mono by default)
+  in the same ffmpeg pass that decodes it; with vad only the speech is kept
+* a chunk is looked up in the transcript cache, else recognized by the backend of the process
+  (Recognizer.batch_size chunks per call)
+* the recognized chunks are journaled, so an interrupted video resumes mid-file
+* the transcript is written atomically as a .txt file, or to the transcript store, and the
+  manifest and the stage timings are updated
+The backend, the cache, the manifest and the store of a process are set by configure().
+"""
+
+import os
+import time
+import logging
+from functools import partial
+import speech_recognition as sr
+from audio_stream import extract_audio
+import recognizers
+import vad_chunker
+import transcript_cache
+import transcript_store
+import stage_timings
+import chunk_recognition
+import chunk_journal
+import manifest
+
+
+def configure(backend='google', backend_options=None, cache=None, cache_size=1024, manifest_path=None, store=None):
+    """
+    Set the recognizer backend, the transcript cache (cache_size in MB), the manifest and the transcript store of this process.
+    """
+    recognizers.configure(backend, **(backend_options or {}))
+    transcript_cache.configure(cache, cache_size * 1024 ** 2)
+    manifest.configure(manifest_path)
+    transcript_store.configure(store)
+
+
+def transcribe_chunks(chunks, indices, video_id, backend=None):
+    """
+    Transcribe consecutive chunks: the chunks missing from the transcript cache are recognized in one
+    recognize_batch() call. Returns the transcript of each chunk, or the exception that failed it.
+    """
+    # the backend is the process default (recognizers.configure) unless a name is given
+    recognizer = recognizers.get_backend(backend) if backend else recognizers.default_backend()
+    pcms = [recognizers.pcm_chunk(chunk) for chunk in chunks]
+
+    # identical audio (re-runs, reposts) is only recognized once
+    cache = transcript_cache.get_cache()
+    keys = [cache.key(pcm, recognizer.identity) for pcm in pcms] if cache is not None else [None] * len(pcms)
+    transcripts = [cache.get(key) if key is not None else None for key in keys]
+    missing = [j for j, transcript in enumerate(transcripts) if transcript is None]
+    if not missing:
+        return transcripts
+
+    try:
+        recognized = recognizer.recognize_batch([pcms[j] for j in missing])
+    except Exception as e:
+        recognized = [e] * len(missing)
+    for j, transcript in zip(missing, recognized):
+        if isinstance(transcript, sr.UnknownValueError):
+            logging.error(f"Chunk {indices[j]} could not be understood: {video_id} - {transcript}")
+            transcript = ""
+        elif isinstance(transcript, Exception):
+            # the chunk fails (not cached, not journaled), so it is recognized again on the next run
+            if isinstance(transcript, sr.RequestError):
+                logging.error(f"Could not request results from {recognizer.identity} for chunk {indices[j]}: {video_id} - {transcript}")
+            transcripts[j] = transcript
+            continue
+        if keys[j] is not None:
+            cache.put(keys[j], recognizer.identity, transcript)
+        transcripts[j] = transcript
+    return transcripts
+
+
+def transcribe_chunk(chunk, index, video_id, backend=None):
+    transcript, = transcribe_chunks([chunk], [index], video_id, backend)
+    if isinstance(transcript, Exception):
+        raise transcript
+    return (index, transcript)
+
+
+def transcribe_audio_chunks(chunks, video_id, chunk_workers=1, journal=None, start=0):
+    # chunk_workers batches are recognized at once (bounded by the global limits set in chunk_recognition.configure),
+    # a batch has the number of chunks the backend recognizes per call (Recognizer.batch_size)
+    # the chunks in the journal are not recognized again, the others are journaled as they complete
+    results = chunk_recognition.recognize_chunks(chunks, partial(transcribe_chunks, video_id=video_id), max_workers=chunk_workers,
+                                                 start=start, done=journal.done if journal else None,
+                                                 on_result=journal.append if journal else None,
+                                                 batch_size=recognizers.default_backend().batch_size)
+    full_transcript = chunk_recognition.join_results(results, video_id)
+    failed = [result.index for result in results if result.error is not None]
+    if failed:
+        raise chunk_journal.IncompleteTranscriptError(video_id, failed)
+    return full_transcript
+
+
+def process_video(video_file, output_file, verbose=False, chunk_workers=1, vad=False, sample_rate=16000, sample_width=2):
+    """
+    Transcribe a video file into output_file/<video_id>.txt (or the transcript store).
+
+    A failure is recorded in the manifest and raised; the journal is kept, so the next run only
+    recognizes the missing chunks.
+    """
+    video_id = os.path.splitext(video_file)[0].split('/')[-1]
+
+    transcript_file = os.path.join(output_file, video_id + '.txt')
+    # the chunks recognized before an interruption are in the journal next to the transcript
+    journal = chunk_journal.ChunkJournal(transcript_file, {'chunk_ms': 60000, 'vad': vad, 'sample_rate': sample_rate,
+                                                           'sample_width': sample_width,
+                                                           'backend': recognizers.default_backend().identity})
+    # fixed chunks map to time: skip the leading chunks that are done without decoding them
+    # (VAD chunks depend on the audio before them, so they are decoded from the start)
+    start = 0 if vad else journal.first_missing()
+
+    manifest.started(video_id, 'transcribe')
+    start_time = time.time()
+    timings = stage_timings.StageTimings(video_id)
+    # Stream the audio in chunks of 1 minute (60000 milliseconds); it is downmixed and resampled
+    # once to the target format (16 kHz mono by default) in the same ffmpeg pass that decodes it
+    audio_chunks = timings.timed(extract_audio(video_file, 60000, sample_rate, 1, sample_width, start * 60000), 'extract')
+
+    if vad:
+        # keep only the speech (up to 1 minute per chunk), silent spans are never sent to the recognizer
+        audio_chunks = timings.timed(vad_chunker.stream_speech_chunks(audio_chunks, 60000), 'vad')
+
+    # Transcribe the audio chunks (each chunk is recognized as soon as it is decoded)
+    try:
+        with timings.stage('recognize'):
+            full_transcript = transcribe_audio_chunks(audio_chunks, video_id, chunk_workers, journal, start)
+    except Exception as e:
+        manifest.failed(video_id, 'transcribe', e, time.time() - start_time)
+        raise
+    finally:
+        # on failure the journal is kept, so the next run only recognizes the missing chunks
+        journal.close()
+    logging.info(f"Transcript Completed: {video_id}")
+    timings.report()
+
+    # written atomically (a partial .txt would be skipped as done) or to the transcript store, then the journal is deleted
+    transcript_file = transcript_store.commit(video_id, full_transcript, journal)
+    manifest.finished(video_id, 'transcribe', len(full_transcript.encode()), time.time() - start_time)
+    logging.info(f"Transcript saved to: {transcript_file}: {video_file}")
+
+    if verbose:
+        print(f"Transcript saved to: {transcript_file}")
+
+    return full_transcript
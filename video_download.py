@@ -0,0 +1,268 @@
+"""
+File: video_download.py
+Description: This file includes the function to downlod and save facebook videos (creators and sponsors).
+It is the single entry point of the downloaders; the video_download_{creators,sponsors}[_server].py
+scripts are shims around it.
+
+Profiles set the paths of a crawl (input CSV, output folder, log file). --shard i/N keeps only the
+videos whose stable hash of video_id falls in shard i of N, so a crawl can be split over N machines
+without overlap and without any coordination.
+
+--audio-only downloads only the smallest usable audio stream (m4a, no video track), which is
+all the transcription needs: far fewer bytes to download and store, and less to decode.
+--disk-quota pauses the downloads while the folder is near the quota and evicts the videos that
+are transcribed (manifest) to make room (see disk_budget.py).
+
+Usage: python video_download.py -p creators --shard 0/4
+       python video_download.py -p sponsors --serial
+       python video_download.py -p creators --audio-only
+Created by: Shahryar Doosti (doosti@chapman.edu)
+Date: 6/2/2024
+"""
+
+import os
+import hashlib
+import pandas as pd
+import yt_dlp as youtube_dl
+import ydl_session
+import manifest
+import disk_budget
+import download_retry
+import logging
+import time
+import argparse
+from functools import partial
+from download_orchestrator import run_downloads
+
+PATH = os.path.dirname(__file__)
+
+# the paths of each crawl; the first CSV that exists is used
+PROFILES = {
+    'creators': {
+        'output': os.path.join(PATH, 'videos', 'Creators'),
+        'csv': [os.path.join(PATH, 'VideoDownloads', 'videos_creators.csv'), os.path.join(PATH, 'videos_creators.csv')],
+        'log': os.path.join(PATH, 'download_videos_creators.log'),
+    },
+    'sponsors': {
+        'output': os.path.join(PATH, 'videos', 'Sponsors'),
+        'csv': [os.path.join(PATH, 'VideoDownloads', 'videos_sponsors.csv'), os.path.join(PATH, 'videos_sponsors.csv')],
+        'log': os.path.join(PATH, 'download_videos_sponsors.log'),
+    },
+}
+
+# audio-only mode: the lowest bitrate audio stream of at least 24 kbps (enough for speech), else any
+# audio stream, else the smallest file with audio; stored as m4a (AAC is copied, not re-encoded)
+# format_sort is reversed ('+' fields), so 'ba' and 'b' pick the lowest bitrate and the smallest size
+# ('w' would pick the largest): e.g. muxed 1 MB, 5 MB and 20 MB formats and no audio stream -> the 1 MB one
+AUDIO_FORMAT = 'ba[abr>=24]/ba/b'
+AUDIO_FORMAT_SORT = ['+abr', '+size']
+AUDIO_EXT = '.m4a'
+VIDEO_EXT = '.mp4'
+
+
+def get_args(argv=None):
+    """
+    Get the command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Download the videos of a profile')
+    parser.add_argument('-p', '--profile', help='The crawl to download', choices=list(PROFILES), required=True)
+    parser.add_argument('--csv', help='The CSV file of the videos (video_id, video_url); defaults to the profile CSV', default=None)
+    parser.add_argument('-o', '--output', help='The output folder; defaults to the profile folder', default=None)
+    parser.add_argument('--shard', help='Only download shard i of N (e.g. 0/4), by a stable hash of video_id', default='0/1')
+    parser.add_argument('-c', '--concurrency', help='The number of downloads at once', type=int, default=64)
+    parser.add_argument('--rate', help='The downloads started per second per host (0 = unlimited)', type=float, default=2.0)
+    parser.add_argument('--jitter', help='The maximum random delay before each download in seconds', type=float, default=0.5)
+    parser.add_argument('--serial', help='One download at a time, at most one per second (sets -c 1 --rate 1 --jitter 0)', action='store_true')
+    parser.add_argument('--reverse', help='Start from the end of the list', action='store_true')
+    parser.add_argument('--audio-only', help='Download only the audio (smallest usable stream, stored as .m4a)', action='store_true')
+    parser.add_argument('--manifest', help='The path to the manifest database (SQLite file)', default=os.path.join(PATH, 'manifest.db'))
+    parser.add_argument('--disk-quota', help='The disk quota of the output folder in GB (0 = unlimited)', type=float, default=0)
+    parser.add_argument('--evict', help='Delete the transcribed videos or compact them to opus when the quota is near', choices=disk_budget.MODES, default='delete')
+    return parser.parse_args(argv)
+
+
+def download_video(url, video_id=False, output_path=None, verbose=True, format='b[filesize<2M] / w', audio_only=False):
+    """
+    Download a video from the given URL.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the video to download.
+    video_id : str, optional
+        The ID of the video. If not provided, it will be extracted from the URL.
+    output_path : str
+        The path to save the downloaded video.
+    verbose : bool, optional
+        Whether to print the status of the download operation.
+    format : str, optional
+        The format of the video to download.
+        e.g., 'bestvideo[height<=50M]+bestaudio[height<=50M]'
+              'bestvideo[filesize<=720]+bestaudio[filesize<=720]'
+              'best'
+    audio_only : bool, optional
+        Download only the audio (AUDIO_FORMAT) to output_path with the .m4a extension; format is ignored.
+
+    Returns the status of the download operation.
+    -------
+    """
+    ydl_opts = {
+        'format': format,
+        'noplaylist': True,      # Disable downloading playlists, only single video
+    }
+    if audio_only:
+        ydl_opts.update({
+            'format': AUDIO_FORMAT,
+            'format_sort': AUDIO_FORMAT_SORT,   # prefer the smallest stream
+            'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': AUDIO_EXT[1:]}],
+        })
+        output_path = os.path.splitext(output_path)[0] + AUDIO_EXT
+    if video_id is False:
+        video_id = url.split('/')[-1]
+    # waits while the disk quota is near (evicting the transcribed videos)
+    disk_budget.wait_for_room()
+    manifest.started(video_id, 'download')
+    start = time.time()
+    try:
+        # the YoutubeDL of this worker is reused across videos; only the output path changes per video
+        # throttling and network errors are retried with backoff, permanent errors (e.g. removed videos) are not
+        # the extension is left to yt-dlp: the audio extraction renames the file to output_path
+        outtmpl = os.path.splitext(output_path)[0] + '.%(ext)s' if audio_only else output_path
+        download_retry.retry(lambda: ydl_session.get_session(ydl_opts).download(url, outtmpl=outtmpl), video_id)
+        logging.info(f"Download completed: {video_id}")
+        nbytes = os.path.getsize(output_path) if os.path.isfile(output_path) else None
+        manifest.finished(video_id, 'download', nbytes, time.time() - start)
+        disk_budget.added(nbytes)
+        if verbose: print(f"Download completed: {url}")
+        return True
+    except youtube_dl.utils.DownloadError as e:
+        logging.error(f"Download error: {video_id} - {e}")
+        download_retry.record_failure(video_id, e, time.time() - start)
+        if verbose: print(f"Download error: {e}")
+        return False
+    except youtube_dl.utils.ExtractorError as e:
+        logging.error(f"Extractor error: {video_id} - {e}")
+        download_retry.record_failure(video_id, e, time.time() - start)
+        if verbose: print(f"Extractor error: {e}")
+        return False
+    except youtube_dl.utils.PostProcessingError as e:
+        logging.error(f"Post-processing error: {video_id} - {e}")
+        download_retry.record_failure(video_id, e, time.time() - start)
+        if verbose: print(f"Post-processing error: {e}")
+        return False
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {video_id} - {e}")
+        download_retry.record_failure(video_id, e, time.time() - start)
+        if verbose: print(f"An unexpected error occurred: {e}")
+        return False
+
+
+def video_data(profile, file_path=None):
+    """
+    Load the videos of a profile from a CSV file.
+
+    Parameters
+    ----------
+    profile : str
+        The name of the profile (creators or sponsors).
+    file_path : str, optional
+        The path to the CSV file. Defaults to the first CSV of the profile that exists.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The video_id and video_url columns.
+    """
+    if file_path is None:
+        candidates = PROFILES[profile]['csv']
+        file_path = next((path for path in candidates if os.path.isfile(path)), candidates[0])
+    return pd.read_csv(file_path)[['video_id','video_url']]
+
+
+def parse_shard(shard):
+    """
+    Parse a shard option 'i/N' into (i, N).
+    """
+    index, count = (int(x) for x in shard.split('/'))
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard: {shard}")
+    return index, count
+
+
+def shard_of(video_id, count):
+    """
+    The shard of a video: a stable hash of its id (the same on every machine and every run).
+    """
+    digest = hashlib.md5(str(video_id).encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+
+def shard_videos(data, shard=(0, 1)):
+    """
+    Keep the rows of the videos of shard (i, N).
+    """
+    index, count = shard
+    if count > 1:
+        data = data[[shard_of(video_id, count) == index for video_id in data.video_id]]
+    return data
+
+
+def find_media(output_path, video_id):
+    """
+    Get the downloaded file of a video (audio or video), or None.
+    """
+    for ext in (AUDIO_EXT, VIDEO_EXT):
+        path = os.path.join(output_path, f"{video_id}{ext}")
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def select_videos(data, output_path, shard=(0, 1), reverse=False, ext=VIDEO_EXT):
+    """
+    Get the (url, video_id, output_path) jobs of a shard that are not downloaded yet.
+    """
+    data = shard_videos(data, shard)
+    tracker = manifest.get_manifest()
+    if tracker is not None:
+        # the videos that are not downloaded yet (one query on the manifest instead of a file check per video)
+        tracker.bootstrap('download', output_path, ext)
+        tracker.add(data.video_id, 'download')
+        data = data[data.video_id.astype(str).isin(tracker.remaining('download'))]
+    videos = [(r[1],r[0],os.path.join(output_path, f"{r[0]}{ext}")) for r in data.to_numpy()] # (url, video_id, output_path)
+    if reverse:
+        # reverse the order of the list (to start from the end of the list)
+        videos = videos[::-1]
+    return videos
+
+
+def main(argv=None):
+    args = get_args(argv)
+    profile = PROFILES[args.profile]
+    output_path = args.output or profile['output']
+    os.makedirs(output_path, exist_ok=True)
+    # Configure logging
+    logging.basicConfig(filename=profile['log'], level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.serial:
+        args.concurrency, args.rate, args.jitter = 1, 1.0, 0.0
+
+    tracker = manifest.configure(args.manifest)
+    disk_budget.configure([output_path], int(args.disk_quota * 1024 ** 3), mode=args.evict)
+    shard = parse_shard(args.shard)
+    ext = AUDIO_EXT if args.audio_only else VIDEO_EXT
+    videos = select_videos(video_data(args.profile, args.csv), output_path, shard, args.reverse, ext)
+    logging.info(f"Downloading {len(videos)} videos: {args.profile} shard {shard[0]}/{shard[1]}")
+    print(f"Number of videos: {len(videos)}")
+
+    # Downloads wait on the network: run many at once (asyncio + threads), rate limited per host
+    download = partial(download_video, audio_only=True) if args.audio_only else download_video
+    results, stats = run_downloads(download, videos, args.concurrency, args.rate or None, jitter=args.jitter)
+    print(f"Completed: {stats.completed}, Failed: {stats.failed}")
+    # permanently failed videos are skipped by later runs
+    print(f"Dead letters: {len(tracker.dead_letters('download'))}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -2,111 +2,44 @@
 File: video_download_creators_server.py
 Description: This file includes the function to downlod and save facebook videos for creators
 (Server Version)
+It is a shim of video_download.py, kept for the existing commands:
+    python video_download.py -p creators --reverse [options]
 Created by: Shahryar Doosti (doosti@chapman.edu)
 Date: 6/2/2024
 """
 
-import os
-import pandas as pd
-import yt_dlp as youtube_dl
-import logging
-import datetime
-import time
-import multiprocessing
-from multiprocessing import Pool
+import sys
+import video_download
+from download_orchestrator import run_downloads
 
-PATH = os.path.dirname(__file__)
-print(PATH)
-OUTPUT_PATH = os.path.join(PATH, 'videos','Creators')
+OUTPUT_PATH = video_download.PROFILES['creators']['output']
 
-# Get today's date
-#today = datetime.date.today()
-
-# Configure logging
-logging.basicConfig(filename=os.path.join(PATH, f'download_videos_creators.log'), level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
 
 def download_video(url, video_id=False, output_path=OUTPUT_PATH, verbose=True, format='b[filesize<2M] / w'):
     """
-    Download a video from the given URL.
+    Download a video from the given URL (see video_download.download_video).
+    """
+    return video_download.download_video(url, video_id, output_path, verbose, format)
 
-    Parameters
-    ----------
-    url : str
-        The URL of the video to download.
-    video_id : str, optional
-        The ID of the video. If not provided, it will be extracted from the URL.
-    output_path : str, optional
-        The path to save the downloaded video.
-    verbose : bool, optional
-        Whether to print the status of the download operation.
-    format : str, optional
-        The format of the video to download.
-        e.g., 'bestvideo[height<=50M]+bestaudio[height<=50M]'
-              'bestvideo[filesize<=720]+bestaudio[filesize<=720]'
-              'best'
 
-    Returns the status of the download operation.
-    -------
+def creator_data(file_path=None):
+    """
+    Load the videos from a CSV file (see video_download.video_data).
     """
-    ydl_opts = {
-        'format': format,
-        'outtmpl': output_path,  # Include the specified path
-        'noplaylist': True,      # Disable downloading playlists, only single video
-    }
-    if video_id is False:
-        video_id = url.split('/')[-1]
-    try:
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        logging.info(f"Download completed: {video_id}")
-        if verbose: print(f"Download completed: {url}")
-        return True
-    except youtube_dl.utils.DownloadError as e:
-        logging.error(f"Download error: {video_id} - {e}")
-        if verbose: print(f"Download error: {e}")
-        return False
-    except youtube_dl.utils.ExtractorError as e:
-        logging.error(f"Extractor error: {video_id} - {e}")
-        if verbose: print(f"Extractor error: {e}")
-        return False
-    except youtube_dl.utils.PostProcessingError as e:
-        logging.error(f"Post-processing error: {video_id} - {e}")
-        if verbose: print(f"Post-processing error: {e}")
-        return False
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {video_id} - {e}")
-        if verbose: print(f"An unexpected error occurred: {e}")
-        return False
+    return video_download.video_data('creators', file_path)
 
 
-def creator_data(file_path = os.path.join(PATH, 'videos_creators.csv')):
+def main(argv=None):
     """
-    Load data from a CSV file.
+    Download the videos of the creators (argv: the options of video_download.py).
 
-    Parameters
-    ----------
-    file_path : str
-        The path to the CSV file.
-
-    Returns
-    -------
-    pandas.DataFrame
-        The loaded data as a pandas DataFrame.
+    The original main(videos) still works: a list of (url, video_id, output_path) jobs is downloaded as is.
     """
-    return pd.read_csv(file_path)[['video_id','video_url']]
+    if argv and not isinstance(argv[0], str):
+        results, _ = run_downloads(download_video, argv)
+        return results
+    return video_download.main(['--profile', 'creators', '--reverse'] + (sys.argv[1:] if argv is None else argv))
 
-def main(videos):
-    # Use multiprocessing Pool to download subtitles concurrently
-    with Pool(multiprocessing.cpu_count()) as pool:
-        pool.starmap(download_video, videos)
 
 if __name__ == '__main__':
-    data = creator_data()
-    videos = [(r[1],r[0],os.path.join(OUTPUT_PATH, f"{r[0]}.mp4")) for r in data.to_numpy()] # (url, video_id, output_path)
-    vidoes = [x for x in videos if not os.path.isfile(x[2])]
-    # reverse the order of the list (to start from the end of the list)
-    videos = videos[::-1]
-    main(videos)
-
-
+    main()
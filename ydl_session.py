@@ -0,0 +1,130 @@
+"""
+This file keeps one long-lived yt-dlp downloader per worker instead of one per download.
+
+Creating a YoutubeDL loads and initializes the extractors, builds the request handlers (opener,
+cookie jar) and compiles the format selector; the connections it opens are dropped when it is
+closed. A session keeps the YoutubeDL of a worker (one per thread and process, since a YoutubeDL
+is not thread safe) and reuses it for every URL with the same base options. Per-item options such
+as the output template are applied for one download and restored afterwards.
+
+The instance is recycled after max_downloads downloads, so its state (cookie jar, caches) stays bounded.
+"""
+
+import os
+import logging
+import contextlib
+import threading
+import yt_dlp as youtube_dl
+
+
+class YDLSession:
+    """
+    A reusable YoutubeDL.
+
+    Parameters
+    ----------
+    opts : dict
+        The base options of the YoutubeDL (e.g. format, noplaylist).
+    max_downloads : int, optional
+        Recreate the YoutubeDL after this many downloads.
+    """
+    def __init__(self, opts, max_downloads=500):
+        self.opts = dict(opts)
+        self.max_downloads = max_downloads
+        self.downloads = 0
+        self._ydl = None
+        self._selectors = {}   # format spec -> compiled format selector
+
+    @property
+    def ydl(self):
+        if self._ydl is None or self.downloads >= self.max_downloads:
+            self.close()
+            self._ydl = youtube_dl.YoutubeDL(dict(self.opts))
+            self._selectors = {self.opts.get('format'): self._ydl.format_selector}
+            self.downloads = 0
+        return self._ydl
+
+    def _format_selector(self, spec):
+        if spec not in self._selectors:
+            self._selectors[spec] = self.ydl.build_format_selector(spec)
+        return self._selectors[spec]
+
+    @contextlib.contextmanager
+    def _overrides(self, overrides):
+        # apply per-item options to the YoutubeDL and restore the base options afterwards
+        ydl = self.ydl
+        saved = {key: ydl.params.get(key) for key in overrides}
+        saved_selector = ydl.format_selector
+        try:
+            for key, value in overrides.items():
+                if key == 'outtmpl':
+                    # the parsed output template is a dict by type ('default', 'thumbnail', ...)
+                    value = dict(ydl.params['outtmpl'], **(value if isinstance(value, dict) else {'default': value}))
+                elif key == 'format':
+                    # the format selector is compiled when the YoutubeDL is created
+                    ydl.format_selector = self._format_selector(value)
+                ydl.params[key] = value
+            ydl._download_retcode = 0   # the return code is sticky across downloads
+            yield ydl
+        finally:
+            ydl.params.update(saved)
+            ydl.format_selector = saved_selector
+            self.downloads += 1
+
+    def download(self, url, **overrides):
+        """
+        Download a URL with the session's YoutubeDL.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the video.
+        **overrides
+            Options for this download only, e.g. outtmpl=output_path or format='best'.
+
+        Returns
+        -------
+        int
+            The yt-dlp return code (0 on success). Download errors raise as with YoutubeDL.download.
+        """
+        with self._overrides(overrides) as ydl:
+            return ydl.download([url])
+
+    def extract_info(self, url, **overrides):
+        """
+        Extract the info dict of a URL without downloading (formats and subtitles are selected).
+        """
+        with self._overrides(overrides) as ydl:
+            return ydl.extract_info(url, download=False)
+
+    def process_info(self, info, **overrides):
+        """
+        Download what the options ask for (e.g. only the subtitles) from an extracted info dict, without extracting again.
+        """
+        with self._overrides(overrides) as ydl:
+            ydl.process_info(info)
+            return ydl._download_retcode
+
+    def close(self):
+        if self._ydl is not None:
+            self._ydl.close()
+            self._ydl = None
+
+
+# the sessions of this thread, keyed by their base options
+_LOCAL = threading.local()
+
+
+def get_session(opts, max_downloads=500):
+    """
+    Get the session of this thread (and process) for a set of base options.
+    """
+    if getattr(_LOCAL, 'pid', None) != os.getpid():
+        # a forked worker must not share the connections of its parent
+        _LOCAL.sessions = {}
+        _LOCAL.pid = os.getpid()
+    key = repr(sorted(opts.items()))
+    if key not in _LOCAL.sessions:
+        logging.debug(f"New yt-dlp session: {key}")
+        _LOCAL.sessions[key] = YDLSession(opts, max_downloads)
+    return _LOCAL.sessions[key]